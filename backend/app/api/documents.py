@@ -1,8 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.parser import parse_document
 from app.utils.validation import validate_file_type
-from app.utils.chunking import chunk_text
-from app.core.embeddings import store_embeddings
+from app.core.document_registry import document_id_for_digest
+from app.core.ingest_cache import content_digest
+from app.services.ingestion import IngestItem
+from app.services.jobs import job_manager
 import logging
 
 router = APIRouter(prefix="/process-document", tags=["documents"])
@@ -11,12 +12,19 @@ router = APIRouter(prefix="/process-document", tags=["documents"])
 async def process_document(file: UploadFile = File(...)):
     try:
         validate_file_type(file.filename)
-        text = await parse_document(file)
-        chunks = chunk_text(text)
-        # Use document_id=1 for all documents (simplified for demo)
-        store_embeddings(chunks, document_id=1)
-        logging.info(f"Processed {file.filename}: {len(chunks)} chunks.")
-        return {"chunks": len(chunks), "status": "processed"}
+        content = await file.read()
+        item = IngestItem(content=content, filename=file.filename)
+        item.document_id = document_id_for_digest(content_digest(content))
+        job = job_manager.submit(item)
+        logging.info(f"Queued {file.filename} as job {job.id}")
+        return {"job_id": job.id, "document_id": item.document_id, "status": job.status}
     except Exception as e:
         logging.error(f"Error processing document {file.filename}: {e}")
-        raise HTTPException(status_code=400, detail=f"Error processing document: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Error processing document: {e}")
+
+@router.get("/jobs/{job_id}")
+async def process_document_status(job_id: str):
+    status = job_manager.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
\ No newline at end of file
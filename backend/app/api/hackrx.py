@@ -2,13 +2,14 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List
-import requests
-import tempfile
-import os
-from app.services.document_processor import parse_document_from_bytes
-from app.utils.chunking import chunk_text
-from app.core.embeddings import store_embeddings, search_similar_chunks
+from app.core.config import settings
+from app.core.embeddings import search_similar_chunks_batch
+from app.services.fetcher import DocumentFetchError, DocumentTooLargeError
+from app.services.answer_cache import answer_with_cache
+from app.services.ingestion import IngestItem, ingest_item
 from app.services.llm import ask_llm
+from app.services.llm_batch import answer_questions_batched
+import asyncio
 import logging
 
 router = APIRouter(prefix="/hackrx", tags=["hackrx"])
@@ -28,58 +29,47 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         raise HTTPException(status_code=401, detail="Invalid authentication token")
     return credentials.credentials
 
+async def answer_questions(document_id: int, questions: List[str]) -> List[str]:
+    """Retrieve context for the questions and answer them with the LLM"""
+    # Search for relevant chunks - one encoder pass for all questions, off the event loop
+    all_context_chunks = await asyncio.get_running_loop().run_in_executor(
+        None, search_similar_chunks_batch, document_id, questions
+    )
+    
+    if settings.LLM_BATCH_MODE:
+        # Questions sharing context go out together in one structured call
+        return await answer_questions_batched(
+            questions, all_context_chunks, lambda i: ask_llm(questions[i], all_context_chunks[i]),
+        )
+    # Answer all questions concurrently - latency is set by the slowest one
+    return list(await asyncio.gather(*(
+        ask_llm(question, context_chunks) for question, context_chunks in zip(questions, all_context_chunks)
+    )))
+
 @router.post("/run", response_model=HackRxResponse)
 async def hackrx_run(request: HackRxRequest, token: str = Depends(verify_token)):
     """
     HackRx endpoint that processes a document from URL and answers multiple questions
     """
     try:
-        # Download document from URL
-        logging.info(f"Downloading document from: {request.documents}")
-        doc_response = requests.get(request.documents)
-        doc_response.raise_for_status()
+        # Stable content-derived ID; download/ingest only if no worker has indexed it
+        item = IngestItem(url=request.documents, default_filename="policy.pdf")
+        document_id = await ingest_item(item)
         
-        # Create a temporary file to mimic UploadFile behavior
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            temp_file.write(doc_response.content)
-            temp_file_path = temp_file.name
+        # Repeat questions about the same document content come from the answer cache
+        answers = await answer_with_cache(
+            "hackrx", item.digest, request.questions,
+            lambda indices: answer_questions(document_id, [request.questions[i] for i in indices]),
+        )
+        for question, answer in zip(request.questions, answers):
+            logging.info(f"Answered question: {question[:50]}... -> {answer[:100]}...")
         
-        try:
-            # Parse the document
-            logging.info("Parsing document...")
-            text = await parse_document_from_bytes(doc_response.content, "policy.pdf")
-            
-            # Chunk the text
-            chunks = chunk_text(text)
-            logging.info(f"Created {len(chunks)} chunks")
-            
-            # Store embeddings with a unique document_id
-            document_id = hash(request.documents) % 1000000  # Simple hash-based ID
-            store_embeddings(chunks, document_id=document_id)
-            logging.info(f"Stored embeddings for document_id: {document_id}")
-            
-            # Process each question
-            answers = []
-            for question in request.questions:
-                logging.info(f"Processing question: {question[:50]}...")
-                
-                # Search for relevant chunks
-                context_chunks = search_similar_chunks(document_id, question)
-                
-                # Get answer from LLM
-                answer = ask_llm(question, context_chunks)
-                answers.append(answer)
-                
-                logging.info(f"Answer: {answer[:100]}...")
-            
-            return HackRxResponse(answers=answers)
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+        return HackRxResponse(answers=answers)
                 
-    except requests.RequestException as e:
+    except DocumentTooLargeError as e:
+        logging.error(f"Document too large: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except DocumentFetchError as e:
         logging.error(f"Error downloading document: {e}")
         raise HTTPException(status_code=400, detail=f"Error downloading document: {e}")
     except Exception as e:
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List
-from app.core.embeddings import search_similar_chunks
+from app.core.embeddings import search_scored_chunks_batch, search_similar_chunks_batch
 from app.services.llm import ask_llm
+from app.services.jobs import job_manager
+import asyncio
 import logging
 
 router = APIRouter(prefix="/ask-question", tags=["queries"])
@@ -17,19 +19,27 @@ class MultipleQueryRequest(BaseModel):
 
 @router.post("/")
 async def ask_question(req: QueryRequest):
-    context_chunks = search_similar_chunks(req.document_id, req.question)
-    answer = ask_llm(req.question, context_chunks)
+    await job_manager.wait_for_document(req.document_id)
+    # Encoding, vector queries and rerank are blocking - keep them off the event loop
+    scored_chunks = (await asyncio.get_running_loop().run_in_executor(
+        None, search_scored_chunks_batch, req.document_id, [req.question]
+    ))[0]
+    context_chunks = [chunk["text"] for chunk in scored_chunks]
+    answer = await ask_llm(req.question, context_chunks)
     logging.info(f"Answered question: {req.question[:50]}...")
     logging.info(f"Full answer: {answer}")
-    return {"answer": answer, "sources": context_chunks}
+    return {"answer": answer, "sources": context_chunks, "scores": [chunk["score"] for chunk in scored_chunks]}
 
 @router.post("/multiple")
 async def ask_multiple_questions(req: MultipleQueryRequest):
-    results = []
-    for question in req.questions:
-        context_chunks = search_similar_chunks(req.document_id, question)
-        answer = ask_llm(question, context_chunks)
-        results.append(answer)
+    await job_manager.wait_for_document(req.document_id)
+    all_context_chunks = await asyncio.get_running_loop().run_in_executor(
+        None, search_similar_chunks_batch, req.document_id, req.questions
+    )
+    results = await asyncio.gather(*(
+        ask_llm(question, context_chunks) for question, context_chunks in zip(req.questions, all_context_chunks)
+    ))
+    for question, answer in zip(req.questions, results):
         logging.info(f"Answered question: {question[:50]}...")
         logging.info(f"Full answer: {answer}")
     
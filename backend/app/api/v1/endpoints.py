@@ -1,10 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from .schemas import QueryRequest, QueryResponse
+from .schemas import QueryRequest, QueryResponse, IngestRequest, IngestJobResponse
+from typing import List, Optional
+import asyncio
 import logging
 import os
-import requests
 from io import BytesIO
+from ...core.config import settings
+from ...core.text_store import get_text_store, iter_text_windows, select_relevant_spans
+from ...services.fetcher import fetch_document
+from ...utils.validation import validate_file_type
 
 # Bearer token security
 security = HTTPBearer()
@@ -26,15 +32,26 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
 # Import document processing services
 try:
     from ...services.document_processor import parse_document_from_bytes
-    from ...services.llm_service import query_llm
+    from ...services.llm_service import query_llm, stream_llm
+    from ...core.ingest_cache import IngestEntry, content_digest, ingest_cache
+    from ...core.embedding_cache import get_embedding_cache
+    from ...core.document_registry import document_id_for_digest, get_document_registry
+    from ...core.lexical_index import best_sentences, build_lexical_index, get_lexical_store
+    from ...utils.chunking import chunk_text
+    from ...services.ingestion import IngestItem
+    from ...services.jobs import job_manager
+    from ...services.llm_batch import answer_questions_batched
+    from ...services.llm_client import DegradedAnswer
+    from ...services.llm_router import get_router
+    from ...services.answer_cache import answer_with_cache, get_answer_cache, lookup_answers
+    from ...services.answer_stream import STREAM_FORMATS, format_event, stream_answers, stream_format
     SERVICES_AVAILABLE = True
 except ImportError as e:
     logging.warning(f"Services import failed: {e}")
     SERVICES_AVAILABLE = False
 
-# Simple in-memory document storage for the session
+# Simple in-memory document storage for the session, keyed by content-derived document ID
 document_store = {}
-document_counter = 0
 
 router = APIRouter(prefix="/hackrx", tags=["hackrx"])
 
@@ -45,13 +62,16 @@ def health_check():
         "status": "healthy",
         "message": "HackRx 6.0 Backend is running",
         "real_processing": SERVICES_AVAILABLE,
-        "document_count": len(document_store)
+        "document_count": len(document_store),
+        "ingest_cache": ingest_cache.stats() if SERVICES_AVAILABLE else None,
+        "embedding_cache": get_embedding_cache().stats() if SERVICES_AVAILABLE else None,
+        "answer_cache": get_answer_cache().stats() if SERVICES_AVAILABLE and settings.ANSWER_CACHE_ENABLED else None,
+        "llm_providers": get_router().stats() if SERVICES_AVAILABLE else None
     }
 
 @router.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
-    """Real document processing with memory optimization"""
-    global document_counter
+    """Accept a document and hand parsing/chunking/embedding to a background job"""
     try:
         filename = file.filename or "unknown"
         
@@ -66,47 +86,41 @@ async def upload_document(file: UploadFile = File(...)):
                 "document_id": 1
             }
         
+        try:
+            validate_file_type(filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Read file content
         content = await file.read()
         
-        # Limit file size to avoid memory issues (2MB max)
-        if len(content) > 2 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail="File too large. Maximum size is 2MB.")
+        # Limit file size to avoid memory issues
+        max_bytes = settings.MAX_UPLOAD_BYTES if settings.LARGE_DOCUMENT_MODE else 2 * 1024 * 1024
+        if len(content) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB.")
         
-        # Parse the document
-        try:
-            text_content = await parse_document_from_bytes(content, filename)
-            
-            # Limit text length to avoid memory issues
-            if len(text_content) > 10000:
-                text_content = text_content[:10000] + "... [truncated for memory optimization]"
-            
-            # Store the document
-            document_counter += 1
-            document_id = document_counter
-            
-            document_store[document_id] = {
-                "filename": filename,
-                "content": text_content,
-                "size": len(content)
-            }
-            
-            # Create preview
-            preview = text_content[:300] + "..." if len(text_content) > 300 else text_content
-            
-            return {
-                "filename": filename,
-                "text_preview": preview,
-                "num_chunks": len(text_content.split('\n')),
-                "status": "success",
-                "message": "Document processed successfully",
-                "document_id": document_id,
-                "content_length": len(text_content)
-            }
-            
-        except Exception as parse_error:
-            logging.error(f"Parsing error for {filename}: {parse_error}")
-            raise HTTPException(status_code=400, detail=f"Could not parse document: {str(parse_error)}")
+        # Parse, chunk and embed in the background; the client polls the job
+        digest = content_digest(content)
+        document_id = document_id_for_digest(digest)
+        document_store[document_id] = {
+            "digest": digest,
+            "filename": filename,
+            "size": len(content),
+            "status": "processing"
+        }
+        item = IngestItem(content=content, filename=filename, keep_text=True)
+        item.document_id = document_id
+        job = job_manager.submit(item, on_complete=store_document_text)
+        
+        return {
+            "filename": filename,
+            "text_preview": "Document received - processing in the background.",
+            "status": "processing",
+            "message": "Poll the job status URL, or query right away - queries wait for processing to finish",
+            "document_id": document_id,
+            "job_id": job.id,
+            "status_url": f"/hackrx/jobs/{job.id}"
+        }
         
     except HTTPException:
         raise
@@ -118,9 +132,79 @@ async def upload_document(file: UploadFile = File(...)):
             "status": "error"
         }
 
+def store_document_text(job):
+    """Job completion hook: the parsed text is in the shared text store now, ready for /run"""
+    item = job.item
+    entry = document_store.get(item.document_id)
+    if entry is None:
+        return
+    if item.error is not None or not get_text_store().has(item.digest):
+        entry["status"] = "failed"
+        entry["error"] = str(item.error) if item.error is not None else "No text extracted"
+        return
+    entry["content_length"] = get_text_store().size(item.digest)
+    entry["status"] = "ready"
+
+def uploaded_document(document_id: int, job: Optional[dict]) -> Optional[dict]:
+    """
+    Where /run finds an uploaded document: {"status", "digest", "text_length"} once its
+    text is in the shared text store - so also for uploads another worker handled -
+    else the upload's status, or None if no upload has this ID.
+    """
+    entry = document_store.get(document_id)
+    digest = entry["digest"] if entry else get_document_registry().digest_for_document(document_id)
+    if digest is not None and get_text_store().has(digest):
+        return {"status": "ready", "digest": digest, "text_length": get_text_store().size(digest)}
+    if entry is not None:
+        return entry
+    if job is not None:
+        return {"status": job["status"], "error": job.get("error") or "still processing"}
+    return None
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Per-stage progress and timing of a background ingestion job"""
+    status = job_manager.status(job_id) if SERVICES_AVAILABLE else None
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+@router.post("/ingest", response_model=IngestJobResponse, status_code=202)
+async def bulk_ingest(payload: IngestRequest, token: str = Depends(verify_token)):
+    """Pre-load many document URLs into the index - runs as a background job; poll the status URL"""
+    if not SERVICES_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Document processing services unavailable")
+    job = job_manager.submit_many([IngestItem(url=url) for url in payload.documents])
+    logging.info(f"Queued bulk ingestion of {len(payload.documents)} documents as job {job.id}")
+    return IngestJobResponse(job_id=job.id, status=job.status, documents=len(payload.documents),
+                             status_url=f"/hackrx/jobs/{job.id}")
+
+@router.post("/ingest/files", response_model=IngestJobResponse, status_code=202)
+async def bulk_ingest_files(files: List[UploadFile] = File(...), token: str = Depends(verify_token)):
+    """Bulk ingestion for uploaded PDF/DOCX files - read now, indexed in a background job; poll the status URL"""
+    if not SERVICES_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Document processing services unavailable")
+    items = [IngestItem(content=await file.read(), filename=file.filename) for file in files]
+    job = job_manager.submit_many(items)
+    logging.info(f"Queued bulk ingestion of {len(items)} uploaded files as job {job.id}")
+    return IngestJobResponse(job_id=job.id, status=job.status, documents=len(items),
+                             status_url=f"/hackrx/jobs/{job.id}")
+
 @router.post("/run")
-async def run_query(payload: QueryRequest, token: str = Depends(verify_token)):
+async def run_query(payload: QueryRequest, token: str = Depends(verify_token),
+                    stream: Optional[str] = Query(None, description="ndjson or sse to stream answers as they complete"),
+                    accept: Optional[str] = Header(None)):
     """HackRx evaluation endpoint - exact format match with Bearer auth"""
+    # Streaming is opt-in; the default response stays the single JSON object
+    fmt = None
+    if SERVICES_AVAILABLE:
+        try:
+            fmt = stream_format(stream, accept)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif stream:
+        raise HTTPException(status_code=503, detail="Streaming needs the document processing services")
+    
     try:
         # Get questions from the request
         questions = payload.questions
@@ -133,36 +217,46 @@ async def run_query(payload: QueryRequest, token: str = Depends(verify_token)):
         
         # Handle document processing based on URL or ID
         document_content = ""
+        document_ref = None  # text store entry for large-document mode
+        lexical_index = None  # BM25 index over the document's chunks
+        document_digest = None  # content hash, scopes the answer cache
         
         if payload.documents.startswith('http'):
             # It's a URL - try to fetch and process the document
             try:
-                response = requests.get(payload.documents, timeout=10)
-                response.raise_for_status()
-                
-                # Try to extract text from the downloaded content
-                if SERVICES_AVAILABLE and parse_document_from_bytes:
-                    try:
-                        # Determine file type from URL or content-type
-                        filename = payload.documents.split('/')[-1]
-                        if not filename.endswith(('.pdf', '.docx')):
-                            content_type = response.headers.get('content-type', '')
-                            if 'pdf' in content_type:
-                                filename = 'document.pdf'
-                            elif 'docx' in content_type or 'document' in content_type:
-                                filename = 'document.docx'
-                        
-                        document_content = await parse_document_from_bytes(response.content, filename)
-                        # Limit content length
-                        if len(document_content) > 10000:
-                            document_content = document_content[:10000] + "... [truncated]"
-                    except Exception as parse_error:
-                        logging.error(f"Document parsing error: {parse_error}")
-                        # Fallback - use first part of response as text
-                        document_content = response.text[:2000] if response.text else "Document content could not be extracted"
-                else:
-                    # Simple fallback - use response text
-                    document_content = response.text[:2000] if response.text else "Document downloaded but content extraction unavailable"
+                with await fetch_document(payload.documents) as fetched:
+                    raw_content = fetched.read()
+                    document_digest = fetched.digest
+                    
+                    # Try to extract text from the downloaded content
+                    if SERVICES_AVAILABLE and parse_document_from_bytes:
+                        try:
+                            # Same bytes as an earlier request - reuse the parsed text
+                            cached = ingest_cache.get(fetched.digest)
+                            if cached is not None:
+                                logging.info(f"Ingest cache hit for {fetched.digest[:12]}, skipping parse")
+                                document_content = cached.text
+                            else:
+                                # Determine file type from URL or content-type
+                                filename = fetched.guess_filename()
+                                
+                                document_content = await parse_document_from_bytes(raw_content, filename)
+                                ingest_cache.put(fetched.digest, IngestEntry(text=document_content))
+                            lexical_index = await asyncio.get_running_loop().run_in_executor(
+                                None, document_lexical_index, fetched.digest, document_content
+                            )
+                            # Limit content length unless spans are selected per question
+                            if not settings.LARGE_DOCUMENT_MODE and len(document_content) > 10000:
+                                document_content = document_content[:10000] + "... [truncated]"
+                        except Exception as parse_error:
+                            logging.error(f"Document parsing error: {parse_error}")
+                            # Fallback - use first part of response as text
+                            response_text = raw_content.decode("utf-8", errors="ignore")
+                            document_content = response_text[:2000] if response_text else "Document content could not be extracted"
+                    else:
+                        # Simple fallback - use response text
+                        response_text = raw_content.decode("utf-8", errors="ignore")
+                        document_content = response_text[:2000] if response_text else "Document downloaded but content extraction unavailable"
                     
             except Exception as url_error:
                 logging.error(f"URL fetch error: {url_error}")
@@ -171,34 +265,100 @@ async def run_query(payload: QueryRequest, token: str = Depends(verify_token)):
             # Try to treat as document ID and look in our store
             try:
                 doc_id = int(payload.documents)
-                if doc_id in document_store:
-                    document_content = document_store[doc_id]["content"]
+                # The upload may still be ingesting in the background, in this worker or another
+                job = await job_manager.wait_for_document(doc_id) if SERVICES_AVAILABLE else None
+                document = uploaded_document(doc_id, job) if SERVICES_AVAILABLE else document_store.get(doc_id)
+                if document is not None and document["status"] == "ready":
+                    document_digest = document["digest"]
+                    if settings.LARGE_DOCUMENT_MODE:
+                        # Full text stays in the mmap'd store; spans are read per question
+                        document_ref = document
+                    else:
+                        document_content = get_text_store().read(document_digest)
+                        # Limit text length to avoid memory issues
+                        if len(document_content) > 10000:
+                            document_content = document_content[:10000] + "... [truncated for memory optimization]"
+                        document_ref = {"digest": document_digest}
+                    lexical_index = get_lexical_store().get(doc_id)
+                elif document is not None:
+                    status = document["status"]
+                    document_content = f"Document {doc_id} is not ready ({status}): {document.get('error', 'still processing')}"
                 else:
                     document_content = "Document ID not found in storage"
             except ValueError:
                 # Not a valid integer ID
                 document_content = f"Invalid document identifier: {payload.documents}"
         
-        # Generate answers for each question
-        answers = []
-        for question in questions:
-            if SERVICES_AVAILABLE and document_content and query_llm:
+        # Generate answers for all questions concurrently
+        has_document = bool(document_content) or document_ref is not None
+        
+        async def answer_question(question: str) -> str:
+            if SERVICES_AVAILABLE and has_document and query_llm:
+                context = question_context(question, document_content, document_ref, lexical_index)
                 try:
                     # Use real LLM to answer the question
-                    llm_response = query_llm(question, document_content)
-                    answers.append(llm_response)
+                    return await query_llm(question, context)
                 except Exception as llm_error:
                     logging.error(f"LLM error: {llm_error}")
                     # Fallback to basic text extraction
-                    basic_answer = extract_relevant_text(document_content, question)
-                    answers.append(basic_answer)
+                    return DegradedAnswer(extract_relevant_text(context, question))
             else:
                 # Fallback response when LLM is not available
-                if document_content:
-                    basic_answer = extract_relevant_text(document_content, question)
-                    answers.append(basic_answer)
+                if has_document:
+                    context = question_context(question, document_content, document_ref, lexical_index)
+                    return extract_relevant_text(context, question)
                 else:
-                    answers.append(f"No document available to answer: {question}")
+                    return f"No document available to answer: {question}"
+        
+        async def answer_question_stream(i: int):
+            question = questions[i]
+            if SERVICES_AVAILABLE and has_document and query_llm:
+                context = question_context(question, document_content, document_ref, lexical_index)
+                started = False
+                try:
+                    async for delta in stream_llm(question, context):
+                        started = True
+                        yield delta
+                except Exception as llm_error:
+                    if started:
+                        # Text already sent can't be taken back - the partial answer is marked degraded
+                        raise
+                    logging.error(f"LLM error: {llm_error}")
+                    yield DegradedAnswer(extract_relevant_text(context, question))
+            else:
+                yield await answer_question(question)
+        
+        async def answer_all(indices: List[int]) -> List[str]:
+            pending = [questions[i] for i in indices]
+            if SERVICES_AVAILABLE and has_document and settings.LLM_BATCH_MODE:
+                # One structured call per batch of questions over their combined context
+                contexts = [
+                    [line for line in question_context(question, document_content, document_ref, lexical_index).split("\n") if line.strip()]
+                    for question in pending
+                ]
+                return await answer_questions_batched(pending, contexts, lambda i: answer_question(pending[i]))
+            return list(await asyncio.gather(*(answer_question(question) for question in pending)))
+        
+        if fmt is not None:
+            # One event per generated piece of text and per finished answer, tagged with the question index
+            lookup = await lookup_answers("v1", document_digest, questions) if has_document else None
+            
+            async def store_answer(i: int, answer: str):
+                if lookup is not None:
+                    await lookup.store([i], [answer])
+            
+            events = stream_answers(questions, answer_question_stream, lookup.answers if lookup else None, store_answer)
+            return StreamingResponse(
+                (format_event(event, fmt) async for event in events),
+                media_type=STREAM_FORMATS[fmt],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        
+        if SERVICES_AVAILABLE and has_document:
+            # Repeat questions about the same document content come from the answer cache
+            answers = await answer_with_cache("v1", document_digest, questions, answer_all)
+        else:
+            answers = await answer_all(list(range(len(questions))))
         
         # Return exactly the format HackRx expects
         return QueryResponse(answers=answers)
@@ -208,27 +368,58 @@ async def run_query(payload: QueryRequest, token: str = Depends(verify_token)):
         # Return error in the expected format
         return QueryResponse(answers=[f"Processing failed: {str(e)}"])
 
+def document_lexical_index(digest: str, document_content: str):
+    """BM25 index for a document parsed outside the ingestion pipeline, built once over the text store"""
+    document_id = document_id_for_digest(digest)
+    index = get_lexical_store().get(document_id)
+    if index is None:
+        get_text_store().put(digest, document_content)
+        index = build_lexical_index(document_id, chunk_text(document_content), document_content, digest)
+    return index
+
+def question_context(question: str, document_content: str, document_ref: dict = None, lexical_index=None) -> str:
+    """Pick the parts of a document worth sending for this question"""
+    large = document_ref is not None or len(document_content) > settings.CONTEXT_BUDGET_CHARS
+    if lexical_index is not None and large:
+        context = lexical_index.top_passages(question, settings.CONTEXT_BUDGET_CHARS)
+        if context:
+            return context
+    if document_ref is not None and "text_length" in document_ref:
+        windows = get_text_store().iter_windows(document_ref["digest"], settings.CONTEXT_WINDOW_CHARS)
+    elif settings.LARGE_DOCUMENT_MODE and len(document_content) > settings.CONTEXT_BUDGET_CHARS:
+        windows = iter_text_windows(document_content, settings.CONTEXT_WINDOW_CHARS)
+    else:
+        return document_content
+    return select_relevant_spans(windows, question, settings.CONTEXT_BUDGET_CHARS, settings.CONTEXT_WINDOW_CHARS)
+
 def extract_relevant_text(content: str, question: str) -> str:
     """Basic text extraction based on keywords from question"""
     if not content:
         return "No document content available."
     
-    # Simple keyword matching
-    question_words = question.lower().split()
-    keywords = [word for word in question_words if len(word) > 3]
-    
-    sentences = content.split('.')
-    relevant_sentences = []
-    
-    for sentence in sentences:
-        sentence_lower = sentence.lower()
-        if any(keyword in sentence_lower for keyword in keywords):
-            relevant_sentences.append(sentence.strip())
-            if len(relevant_sentences) >= 3:  # Limit to 3 relevant sentences
-                break
-    
-    if relevant_sentences:
-        return ". ".join(relevant_sentences) + "."
+    if SERVICES_AVAILABLE:
+        # BM25 over the context's sentences - exact terms like "NCD" count too
+        relevant_sentences = best_sentences(question, content, max_sentences=3)
+        if relevant_sentences:
+            return " ".join(relevant_sentences)
+        sentences = content.split('.')
     else:
-        # Return first few sentences if no keywords match
-        return ". ".join(sentences[:2]) + "." if len(sentences) >= 2 else content[:500] + "..."
+        # Simple keyword matching
+        question_words = question.lower().split()
+        keywords = [word for word in question_words if len(word) > 3]
+        
+        sentences = content.split('.')
+        relevant_sentences = []
+        
+        for sentence in sentences:
+            sentence_lower = sentence.lower()
+            if any(keyword in sentence_lower for keyword in keywords):
+                relevant_sentences.append(sentence.strip())
+                if len(relevant_sentences) >= 3:  # Limit to 3 relevant sentences
+                    break
+        
+        if relevant_sentences:
+            return ". ".join(relevant_sentences) + "."
+    
+    # Return first few sentences if no keywords match
+    return ". ".join(sentences[:2]) + "." if len(sentences) >= 2 else content[:500] + "..."
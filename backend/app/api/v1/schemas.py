@@ -1,9 +1,18 @@
 from pydantic import BaseModel
-from typing import List, Union, Optional
+from typing import List
 
 class QueryRequest(BaseModel):
     documents: str  # URL to document or document identifier
     questions: List[str]  # Array of questions as per HackRx format
 
 class QueryResponse(BaseModel):
-    answers: List[str]  # Simple array of answers as per HackRx format 
\ No newline at end of file
+    answers: List[str]  # Simple array of answers as per HackRx format
+
+class IngestRequest(BaseModel):
+    documents: List[str]  # URLs of documents to pre-load into the index
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed or failed
+    documents: int  # URLs or files in the job
+    status_url: str
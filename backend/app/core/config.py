@@ -7,10 +7,130 @@ env_path = Path(__file__).resolve().parent.parent.parent / '.env'
 load_dotenv(env_path)
 
 class Settings:
+    # Local working data (text store, registries, caches)
+    DATA_DIR = os.getenv("DATA_DIR", str(Path(__file__).resolve().parent.parent.parent / "data"))
+
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    GROK_API_KEY = os.getenv("GROK_API_KEY")
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
     PINECONE_ENV = os.getenv("PINECONE_ENV")
     PINECONE_INDEX = os.getenv("PINECONE_INDEX")
+    PINECONE_HOST = os.getenv("PINECONE_HOST", "https://hackrx-documents-nebxkgj.svc.aped-4627-b74a.pinecone.io")
+    # pinecone (remote), numpy (in-process, single node / tests) or mmap (persistent local index)
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
+    # mmap store: on-disk row format (float16 or int8) and dead-row fraction that triggers compaction
+    VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float16")
+    VECTOR_INDEX_COMPACT_RATIO = float(os.getenv("VECTOR_INDEX_COMPACT_RATIO", "0.5"))
     DATABASE_URL = os.getenv("DATABASE_URL")
+    # Vector upserts: batch limits (vectors / estimated request bytes), parallel batches, retries
+    UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+    UPSERT_BATCH_MAX_BYTES = int(os.getenv("UPSERT_BATCH_MAX_BYTES", str(2 * 1024 * 1024)))
+    UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+    UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "4"))
+    UPSERT_BACKOFF_SECONDS = float(os.getenv("UPSERT_BACKOFF_SECONDS", "0.5"))
+
+    # Content-addressed cache of parsed text / chunks / embeddings (bytes)
+    INGEST_CACHE_MAX_BYTES = int(os.getenv("INGEST_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # Async document download (seconds / bytes)
+    FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))
+    FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "30"))
+    FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "20"))
+    FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(50 * 1024 * 1024)))
+    FETCH_SPOOL_MAX_MEMORY = int(os.getenv("FETCH_SPOOL_MAX_MEMORY", str(4 * 1024 * 1024)))
+
+    # Page-parallel PDF extraction (process pool)
+    PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+
+    # Large-document mode: full text lives in an mmap'd store instead of being truncated
+    LARGE_DOCUMENT_MODE = os.getenv("LARGE_DOCUMENT_MODE", "true").lower() == "true"
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+    CONTEXT_WINDOW_CHARS = int(os.getenv("CONTEXT_WINDOW_CHARS", "500"))
+    CONTEXT_BUDGET_CHARS = int(os.getenv("CONTEXT_BUDGET_CHARS", "2000"))
+
+    # Embedding model and token-based chunking
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-en-v1.5")
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1024"))
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, torch-int8, onnx, openvino
+    EMBEDDING_MODEL_FILE = os.getenv("EMBEDDING_MODEL_FILE")  # optional export file for onnx/openvino
+    EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "false").lower() == "true"
+    # Optional reduced index dimension: none, truncate (Matryoshka-style) or pca (fitted offline)
+    EMBEDDING_REDUCTION = os.getenv("EMBEDDING_REDUCTION", "none")
+    EMBEDDING_REDUCED_DIM = int(os.getenv("EMBEDDING_REDUCED_DIM", "256"))
+    EMBEDDING_PCA_PATH = os.getenv("EMBEDDING_PCA_PATH")  # default DATA_DIR/pca-<dim>.npz
+    EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+    EMBEDDING_CACHE_DISK = os.getenv("EMBEDDING_CACHE_DISK", "true").lower() == "true"
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+    # Retrieval: query expansion (glossary or none), concurrent vector queries, RRF merge
+    QUERY_EXPANSION = os.getenv("QUERY_EXPANSION", "glossary")
+    QUERY_EXPANSION_FILE = os.getenv("QUERY_EXPANSION_FILE")  # JSON {"term": ["variant", ...]}
+    QUERY_EXPANSION_MAX_VARIANTS = int(os.getenv("QUERY_EXPANSION_MAX_VARIANTS", "4"))
+    RETRIEVAL_CONCURRENCY = int(os.getenv("RETRIEVAL_CONCURRENCY", "16"))
+    RETRIEVAL_TOP_K_PER_QUERY = int(os.getenv("RETRIEVAL_TOP_K_PER_QUERY", "5"))
+    RETRIEVAL_MAX_CHUNKS = int(os.getenv("RETRIEVAL_MAX_CHUNKS", "6"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    # BM25 index built at ingest, fused with the dense results
+    HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+    LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "1.0"))
+    LEXICAL_INDEX_MEMORY_ITEMS = int(os.getenv("LEXICAL_INDEX_MEMORY_ITEMS", "64"))
+    # Optional cross-encoder rerank: over-fetch RERANK_CANDIDATES, keep RERANK_TOP_N within the budget
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "4"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+
+    # Async LLM calls: pooled connections, timeouts (seconds), max in-flight requests per provider
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+    LLM_CONCURRENCY_GEMINI = int(os.getenv("LLM_CONCURRENCY_GEMINI", "8"))
+    LLM_CONCURRENCY_GROQ = int(os.getenv("LLM_CONCURRENCY_GROQ", "4"))
+    LLM_CONCURRENCY_GROK = int(os.getenv("LLM_CONCURRENCY_GROK", "4"))
+    # Optional multi-question mode: one JSON-answer call per batch, sized to a token budget
+    LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "false").lower() == "true"
+    LLM_BATCH_MAX_QUESTIONS = int(os.getenv("LLM_BATCH_MAX_QUESTIONS", "8"))
+    LLM_BATCH_MAX_PROMPT_TOKENS = int(os.getenv("LLM_BATCH_MAX_PROMPT_TOKENS", "6000"))
+    LLM_BATCH_ANSWER_TOKENS = int(os.getenv("LLM_BATCH_ANSWER_TOKENS", "250"))
+    # Provider routing: rolling latency/error stats, hedged requests past the primary's p95, circuit breakers
+    LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "200"))
+    LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+    LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8.0"))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+    LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+    # Semantic answer cache (DATA_DIR/answers.sqlite3), scoped by document digest
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))  # cosine, plus equal key terms
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "50000"))
+    ANSWER_CACHE_REFRESH_SECONDS = float(os.getenv("ANSWER_CACHE_REFRESH_SECONDS", "5"))
+
+    # How long a URL -> content digest mapping is trusted before re-downloading (seconds)
+    DOCUMENT_URL_TTL = int(os.getenv("DOCUMENT_URL_TTL", "3600"))
+
+    # Bulk ingestion pipeline: workers per stage and bounded queue depth between stages
+    PIPELINE_DOWNLOAD_CONCURRENCY = int(os.getenv("PIPELINE_DOWNLOAD_CONCURRENCY", "8"))
+    PIPELINE_PARSE_WORKERS = int(os.getenv("PIPELINE_PARSE_WORKERS", "2"))
+    PIPELINE_CHUNK_WORKERS = int(os.getenv("PIPELINE_CHUNK_WORKERS", "2"))
+    PIPELINE_EMBED_WORKERS = int(os.getenv("PIPELINE_EMBED_WORKERS", "1"))
+    PIPELINE_UPSERT_WORKERS = int(os.getenv("PIPELINE_UPSERT_WORKERS", "2"))
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+    # Background ingestion jobs
+    INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+    INGEST_JOB_RETENTION = int(os.getenv("INGEST_JOB_RETENTION", "3600"))
+    INGEST_WAIT_TIMEOUT = float(os.getenv("INGEST_WAIT_TIMEOUT", "60"))
+    INGEST_WAIT_POLL_SECONDS = float(os.getenv("INGEST_WAIT_POLL_SECONDS", "0.5"))  # waiting on another worker's job
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class Projection:
+    """Maps full model embeddings to the (smaller) dimension stored in the index"""
+
+    method = "none"
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def apply(self, vectors) -> np.ndarray:
+        raise NotImplementedError
+
+
+class TruncationProjection(Projection):
+    """
+    Matryoshka-style: keep the leading dimensions and re-normalise. Only loses little
+    recall on models trained for it - check with app.tools.dimension_recall first.
+    """
+
+    method = "truncate"
+
+    def apply(self, vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return _normalize_rows(vectors[:, :self.dimension])
+
+
+class PcaProjection(Projection):
+    """Projection onto the top principal components of our own corpus embeddings"""
+
+    method = "pca"
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        super().__init__(components.shape[0])
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)  # (dimension, model dimension)
+
+    @classmethod
+    def fit(cls, vectors, dimension: int) -> "PcaProjection":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dimension > min(vectors.shape):
+            raise ValueError(f"Need at least {dimension} sample vectors to fit a {dimension}-dim PCA")
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dimension])
+
+    def apply(self, vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return _normalize_rows((vectors - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, mean=self.mean, components=self.components)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PcaProjection":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["mean"], data["components"])
+
+
+def pca_path(dimension: int) -> str:
+    return settings.EMBEDDING_PCA_PATH or os.path.join(settings.DATA_DIR, f"pca-{dimension}.npz")
+
+
+def index_dimension() -> int:
+    """Dimension of the vectors the index stores"""
+    if settings.EMBEDDING_REDUCTION == "none":
+        return settings.EMBEDDING_DIM
+    return settings.EMBEDDING_REDUCED_DIM
+
+
+def index_tag() -> str:
+    """Distinguishes on-disk indexes built with different projections"""
+    if settings.EMBEDDING_REDUCTION == "none":
+        return ""
+    return f"-{settings.EMBEDDING_REDUCTION}{settings.EMBEDDING_REDUCED_DIM}"
+
+
+_projection = None
+_projection_loaded = False
+_projection_lock = threading.Lock()
+
+
+def get_projection() -> Optional[Projection]:
+    """The configured projection, or None when the index stores full embeddings"""
+    global _projection, _projection_loaded
+    if not _projection_loaded:
+        with _projection_lock:
+            if not _projection_loaded:
+                method = settings.EMBEDDING_REDUCTION
+                dimension = settings.EMBEDDING_REDUCED_DIM
+                if method == "truncate":
+                    _projection = TruncationProjection(dimension)
+                elif method == "pca":
+                    # Storing and searching must use the same projection, so a missing fit is fatal
+                    _projection = PcaProjection.load(pca_path(dimension))
+                    if _projection.dimension != dimension:
+                        raise ValueError(f"PCA at {pca_path(dimension)} is {_projection.dimension}-dim, expected {dimension}")
+                elif method != "none":
+                    raise ValueError(f"Unknown EMBEDDING_REDUCTION: {method}")
+                if _projection is not None:
+                    logging.info(f"Reducing embeddings to {dimension} dims ({method})")
+                _projection_loaded = True
+    return _projection
+
+
+def reduce_embeddings(vectors) -> np.ndarray:
+    """Project full model embeddings into index space (a no-op without reduction)"""
+    if len(vectors) == 0:
+        return np.zeros((0, index_dimension()), dtype=np.float32)
+    projection = get_projection()
+    if projection is None:
+        return np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return projection.apply(vectors)
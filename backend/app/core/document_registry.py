@@ -0,0 +1,206 @@
+import os
+import secrets
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.core.config import settings
+from app.core.dimension_reduction import index_tag
+
+
+def document_id_for_digest(digest: str) -> int:
+    """
+    Stable document ID from the content digest. 52 bits, so it survives Pinecone's
+    float metadata exactly and is the same in every worker and after restarts.
+    """
+    return int(digest[:13], 16)
+
+
+def index_key() -> str:
+    """
+    The vector index "indexed" refers to - switching stores, or the embedding
+    reduction (which gets its own index), means indexing again
+    """
+    if settings.VECTOR_STORE == "pinecone":
+        return f"pinecone:{settings.PINECONE_INDEX}{index_tag()}"
+    return f"{settings.VECTOR_STORE}{index_tag()}"
+
+
+class DocumentRegistry:
+    """
+    SQLite registry shared by all workers on a node: URL -> content digest, and
+    (digest, vector index) -> indexing state. Lets any worker skip documents that are
+    already indexed in the index it is configured for.
+
+    A document's vectors are stored under its index ID, normally its document ID. A
+    revised URL passes its predecessor's index ID on, so chunks that didn't change
+    keep their vectors (see assign_index_id).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " digest TEXT PRIMARY KEY, document_id INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS indexed ("
+                " digest TEXT NOT NULL, index_key TEXT NOT NULL, chunk_count INTEGER NOT NULL,"
+                " indexed_at REAL NOT NULL, index_id INTEGER, PRIMARY KEY (digest, index_key))"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(indexed)")]
+            if "index_id" not in columns:
+                # Registries from before index IDs stored vectors under the document ID
+                conn.execute("ALTER TABLE indexed ADD COLUMN index_id INTEGER")
+                digests = [row[0] for row in conn.execute("SELECT DISTINCT digest FROM indexed")]
+                conn.executemany(
+                    "UPDATE indexed SET index_id = ? WHERE digest = ?",
+                    [(document_id_for_digest(digest), digest) for digest in digests],
+                )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY, digest TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " digest TEXT PRIMARY KEY, uploaded_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call keeps this safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup_url(self, url: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT u.digest, u.fetched_at, i.indexed_at FROM urls u"
+                " LEFT JOIN indexed i ON i.digest = u.digest AND i.index_key = ? WHERE u.url = ?",
+                (index_key(), url),
+            ).fetchone()
+        if row is None:
+            return None
+        digest, fetched_at, indexed_at = row
+        return {
+            "digest": digest,
+            "document_id": document_id_for_digest(digest),
+            "fetched_at": fetched_at,
+            "indexed": indexed_at is not None,
+        }
+
+    def record_url(self, url: str, digest: str) -> int:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, digest, fetched_at) VALUES (?, ?, ?)",
+                (url, digest, time.time()),
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (digest, document_id) VALUES (?, ?)",
+                (digest, document_id_for_digest(digest)),
+            )
+        return document_id_for_digest(digest)
+
+    def record_upload(self, digest: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (digest, uploaded_at) VALUES (?, ?)", (digest, time.time())
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (digest, document_id) VALUES (?, ?)",
+                (digest, document_id_for_digest(digest)),
+            )
+
+    def digest_for_document(self, document_id: int) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def references(self, digest: str) -> int:
+        """How many registered URLs and uploads currently stand for this content"""
+        with self._connect() as conn:
+            urls = conn.execute("SELECT COUNT(*) FROM urls WHERE digest = ?", (digest,)).fetchone()[0]
+            uploads = conn.execute("SELECT COUNT(*) FROM uploads WHERE digest = ?", (digest,)).fetchone()[0]
+        return urls + uploads
+
+    def is_indexed(self, digest: str) -> bool:
+        return self.index_id(digest) is not None
+
+    def index_id(self, digest: str) -> Optional[int]:
+        """ID the document's vectors are stored under in the configured index, None if not indexed"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT index_id FROM indexed WHERE digest = ? AND index_key = ?", (digest, index_key())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def vector_document_id(self, document_id: int) -> int:
+        """What to filter the index by for a document ID (itself unless it inherited another's vectors)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT i.index_id FROM indexed i JOIN documents d ON d.digest = i.digest"
+                " WHERE d.document_id = ? AND i.index_key = ?",
+                (document_id, index_key()),
+            ).fetchone()
+        return row[0] if row is not None else document_id
+
+    def assign_index_id(self, digest: str, previous_digest: str = None) -> int:
+        """
+        Index ID to store a document's vectors under. A revision takes over the ID of
+        the content it replaces if nothing else refers to that content any more, so
+        re-indexing only touches the chunks that changed. Otherwise it is the document
+        ID, or a fresh one if a revision of some other content already took that.
+        """
+        current = self.index_id(digest)
+        if current is not None:
+            return current
+        if previous_digest is not None and not self.references(previous_digest):
+            previous = self.index_id(previous_digest)
+            if previous is not None:
+                return previous
+        index_id = document_id_for_digest(digest)
+        while self._index_id_taken(index_id):
+            index_id = secrets.randbits(52)
+        return index_id
+
+    def _index_id_taken(self, index_id: int) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM indexed WHERE index_key = ? AND index_id = ?", (index_key(), index_id)
+            ).fetchone()
+        return row is not None
+
+    def mark_indexed(self, digest: str, chunk_count: int, index_id: int = None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (digest, document_id) VALUES (?, ?)",
+                (digest, document_id_for_digest(digest)),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed (digest, index_key, chunk_count, indexed_at, index_id)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (digest, index_key(), chunk_count, time.time(),
+                 index_id if index_id is not None else document_id_for_digest(digest)),
+            )
+
+    def mark_unindexed(self, digest: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM indexed WHERE digest = ? AND index_key = ?", (digest, index_key()))
+
+
+_registry = None
+
+
+def get_document_registry() -> DocumentRegistry:
+    global _registry
+    if _registry is None:
+        _registry = DocumentRegistry(os.path.join(settings.DATA_DIR, "documents.sqlite3"))
+    return _registry
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache: an in-memory LRU in front of a SQLite file shared by
+    all workers. Keys are sha256(model key + normalized text); vectors are stored as
+    float16 to halve memory and disk use.
+    """
+
+    def __init__(self, model_key: str, memory_items: int, disk_path: Optional[str]):
+        self.model_key = model_key
+        self.memory_items = memory_items
+        self.disk_path = disk_path
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.disk_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_key}\0{_normalize(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached float16 vectors for texts, None where not cached"""
+        keys = [self.key(text) for text in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        if missing and self.disk_path:
+            rows = []
+            key_list = list(missing)
+            with self._connect() as conn:
+                for start in range(0, len(key_list), 500):
+                    batch = key_list[start:start + 500]
+                    rows.extend(conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall())
+            with self._lock:
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float16)
+                    self._remember(key, vector)
+                    for i in missing.pop(key):
+                        found[i] = vector
+                        self.disk_hits += 1
+
+        with self._lock:
+            self.misses += sum(len(positions) for positions in missing.values())
+        return found
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        entries = {self.key(text): np.asarray(vector, dtype=np.float16) for text, vector in zip(texts, vectors)}
+        with self._lock:
+            for key, vector in entries.items():
+                self._remember(key, vector)
+        if self.disk_path and entries:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in entries.items()],
+                )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            model_key=f"{settings.EMBEDDING_MODEL}|{settings.EMBEDDING_BACKEND}|{settings.EMBEDDING_MODEL_FILE or ''}",
+            memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+            disk_path=os.path.join(settings.DATA_DIR, "embeddings.sqlite3") if settings.EMBEDDING_CACHE_DISK else None,
+        )
+    return _embedding_cache
@@ -1,74 +1,239 @@
 
 from app.core.config import settings
-import pinecone
-
-from sentence_transformers import SentenceTransformer
-
-_index = None
-# Use a 1024-dim model compatible with Pinecone index
-_model = SentenceTransformer('BAAI/bge-large-en-v1.5')
-
-def get_pinecone_index():
-    global _index
-    if _index is None:
-        from pinecone import Pinecone
-        pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-        _index = pc.Index(
-            settings.PINECONE_INDEX,
-            host="https://hackrx-documents-nebxkgj.svc.aped-4627-b74a.pinecone.io"
-        )
-    return _index
-
-def store_embeddings(chunks, document_id=1):
-    index = get_pinecone_index()
-    embeddings = _model.encode(chunks).tolist()
-    vectors = []
-    for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-        vectors.append({
-            "id": f"doc-{document_id}-chunk-{i}",
-            "values": emb,
-            "metadata": {"text": chunk, "document_id": document_id}
-        })
-    index.upsert(vectors)
+from app.core.dimension_reduction import reduce_embeddings
+from app.core.document_registry import get_document_registry
+from app.core.embedding_cache import get_embedding_cache
+from app.core.lexical_index import get_lexical_store
+from app.core.query_expansion import expand_query
+from app.core.reranker import rerank_batch
+from app.core.vector_store import batched_upsert, get_vector_store
+from app.utils.ranking import reciprocal_rank_fusion
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import importlib.util
+import logging
+import threading
+import time
+import numpy as np
 
-def search_similar_chunks(document_id, question):
-    index = get_pinecone_index()
+# 1024-dim model compatible with the Pinecone index, loaded on first use
+_model = None
+_model_lock = threading.Lock()
+_query_pool = None
+
+def _load_model():
+    """Build the encoder for the configured CPU inference backend"""
+    from sentence_transformers import SentenceTransformer
     
-    # Create multiple search queries to find relevant information
-    search_queries = [
-        question,  # Original question
-        "grace period premium payment thirty days",  # Specific terms
-        "premium due date grace period days",  # Alternative phrasing
-        "renewal premium payment grace"  # Another variation
-    ]
+    started = time.perf_counter()
+    backend = settings.EMBEDDING_BACKEND
+    if backend in ("onnx", "openvino"):
+        if importlib.util.find_spec("optimum") is None:
+            extra = "onnxruntime" if backend == "onnx" else "openvino"
+            raise ImportError(f"EMBEDDING_BACKEND={backend} needs optimum: pip install 'optimum[{extra}]'")
+        # e.g. EMBEDDING_MODEL_FILE=onnx/model_qint8_avx512_vnni.onnx for an int8 export
+        model_kwargs = {"file_name": settings.EMBEDDING_MODEL_FILE} if settings.EMBEDDING_MODEL_FILE else None
+        model = SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu", backend=backend, model_kwargs=model_kwargs)
+    elif backend in ("torch", "torch-int8"):
+        model = SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu")
+        if backend == "torch-int8":
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
     
-    all_chunks = []
-    chunk_texts = set()  # To avoid duplicates
+    dimension = model.get_sentence_embedding_dimension()
+    if dimension != settings.EMBEDDING_DIM:
+        raise ValueError(f"{settings.EMBEDDING_MODEL} produces {dimension}-dim vectors, index expects {settings.EMBEDDING_DIM}")
+    logging.info(f"Loaded {settings.EMBEDDING_MODEL} ({backend}) in {time.perf_counter() - started:.1f}s")
+    return model
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _load_model()
+    return _model
+
+def warmup_model():
+    """Load the encoder and run one batch so the first request doesn't pay for it"""
+    get_model().encode(["warmup"])
+
+def encode_texts(texts, batch_size=32):
+    """
+    Encode texts into a (len(texts), 1024) float32 array. Cached vectors are reused;
+    only texts never seen before (for this model) go through the encoder.
+    """
+    cache = get_embedding_cache()
+    vectors = cache.get_many(texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        encoded = get_model().encode(missing, batch_size=batch_size)
+        cache.put_many(missing, encoded)
+        by_text = dict(zip(missing, encoded))
+        vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+    if not vectors:
+        return np.zeros((0, settings.EMBEDDING_DIM), dtype=np.float32)
+    return np.vstack(vectors).astype(np.float32)
+
+def encode_chunks(chunks):
+    """Encode chunk texts into a (len(chunks), 1024) numpy array"""
+    return encode_texts(chunks)
+
+def chunk_id(document_id, chunk):
+    """Stable, content-derived vector ID - unchanged chunks keep their ID across revisions"""
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+    return f"doc-{document_id}-{digest}"
+
+def _existing_chunk_ids(store, document_id):
+    """IDs stored for a document, or None if the index can't list them"""
+    # Ask the index every time - another worker may have revised the document
+    ids = store.list_ids(f"doc-{document_id}-")
+    return set(ids) if ids is not None else None
+
+def unstored_chunks(chunks, document_id):
+    """Distinct chunk texts with no vector stored under document_id yet - the ones to encode"""
+    existing = _existing_chunk_ids(get_vector_store(), document_id) or set()
+    return [chunk for chunk in dict.fromkeys(chunks) if chunk_id(document_id, chunk) not in existing]
+
+def delete_document_vectors(document_id):
+    """Remove every vector of a document from the index; returns how many, None if the index can't tell"""
+    store = get_vector_store()
+    ids = _existing_chunk_ids(store, document_id)
+    if ids is None:
+        store.delete_where({"document_id": document_id})
+        return None
+    if ids:
+        store.delete(list(ids))
+    return len(ids)
+
+def store_embeddings(chunks, document_id=1, embeddings=None, on_progress=None, pages=None):
+    """
+    Sync the index with the current chunks of a document: only chunks whose content
+    hash isn't stored yet are embedded and upserted, and vanished chunks are deleted.
+    If the index can't list IDs, the document's vectors are deleted by metadata filter
+    and every chunk is upserted again.
+    New vectors go out in parallel batches; on_progress(upserted, total) tracks them.
+    embeddings maps chunk text -> vector for chunks encoded beforehand; pages, if
+    given, is the page each chunk starts on and goes into the metadata.
+    """
+    store = get_vector_store()
+    ids = [chunk_id(document_id, chunk) for chunk in chunks]
+    existing = _existing_chunk_ids(store, document_id)
+    if existing is None:
+        store.delete_where({"document_id": document_id})
+        existing = set()
+    
+    new_positions = []
+    seen = set()
+    for i, vector_id in enumerate(ids):
+        if vector_id not in existing and vector_id not in seen:
+            new_positions.append(i)
+        seen.add(vector_id)
+    stale_ids = list(existing - seen)
     
-    for query in search_queries:
-        embedding = _model.encode([query])[0].tolist()
-        # First try with document_id filter
-        results = index.query(
-            vector=embedding,
-            top_k=3,
-            include_metadata=True,
-            filter={"document_id": document_id}
-        )
-        
-        # If no results with filter, try without filter
-        if not results['matches']:
-            results = index.query(
-                vector=embedding,
-                top_k=3,
-                include_metadata=True
-            )
-        
-        # Collect unique chunks
-        for match in results['matches']:
-            text = match['metadata'].get('text', '')
-            if text and text not in chunk_texts:
-                chunk_texts.add(text)
-                all_chunks.append(text)
+    if new_positions:
+        embeddings = dict(embeddings or {})
+        missing = list(dict.fromkeys(chunks[i] for i in new_positions if chunks[i] not in embeddings))
+        if missing:
+            embeddings.update(zip(missing, encode_chunks(missing)))
+        full_embeddings = np.vstack([embeddings[chunks[i]] for i in new_positions])
+        new_embeddings = reduce_embeddings(full_embeddings).tolist()
+        vectors = []
+        for i, emb in zip(new_positions, new_embeddings):
+            metadata = {"text": chunks[i], "document_id": document_id}
+            if pages is not None and pages[i] is not None:
+                metadata["page"] = pages[i]
+            vectors.append({
+                "id": ids[i],
+                "values": emb,
+                "metadata": metadata
+            })
+        batched_upsert(store, vectors, on_progress=on_progress)
+    if stale_ids:
+        store.delete(stale_ids)
     
-    # Return up to 6 most relevant unique chunks
-    return all_chunks[:6]
\ No newline at end of file
+    stats = {"added": len(new_positions), "deleted": len(stale_ids), "unchanged": len(seen) - len(new_positions)}
+    logging.info(f"Document {document_id} re-ingest: {stats}")
+    return stats
+
+def encode_queries(queries):
+    """Encode query strings in one forward pass, encoding each distinct string once"""
+    unique = list(dict.fromkeys(queries))
+    embeddings = encode_texts(unique, batch_size=min(64, max(1, len(unique))))
+    by_text = dict(zip(unique, embeddings))
+    return [by_text[query] for query in queries]
+
+def _get_query_pool():
+    global _query_pool
+    if _query_pool is None:
+        _query_pool = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_CONCURRENCY, thread_name_prefix="vector-query")
+    return _query_pool
+
+def _query_all(store, requests):
+    """Run (vector, filter) queries against the store concurrently, results in request order"""
+    top_k = settings.RETRIEVAL_TOP_K_PER_QUERY
+    return list(_get_query_pool().map(lambda request: store.query(request[0], top_k=top_k, filter=request[1]), requests))
+
+def _fuse(match_lists, lexical_ranked=None, limit=None):
+    """
+    Reciprocal-rank fusion of one question's dense variant lists (and its BM25 list,
+    if the document has a lexical index), keyed by chunk text. Returns (text, score).
+    """
+    ranked_lists = [[match['metadata'].get('text', '') for match in matches] for matches in match_lists]
+    ranked_lists = [[text for text in ranked if text] for ranked in ranked_lists]
+    weights = [1.0] * len(ranked_lists)
+    if lexical_ranked:
+        ranked_lists.append(lexical_ranked)
+        weights.append(settings.LEXICAL_WEIGHT)
+    fused = reciprocal_rank_fusion(ranked_lists, k=settings.RRF_K, weights=weights)
+    return fused[:limit or settings.RETRIEVAL_MAX_CHUNKS]
+
+def search_scored_chunks_batch(document_id, questions):
+    """
+    Retrieve scored context chunks ({"text", "score"}) for every question of a request. All questions and their
+    expansions are encoded in one batch and queried concurrently; each question's
+    variant lists and its BM25 hits are merged with reciprocal-rank fusion. With
+    RERANK_ENABLED the fusion over-fetches and a cross-encoder picks the final chunks.
+    """
+    store = get_vector_store()
+    # A revised document may live under the vectors of the revision it replaced
+    vector_document_id = get_document_registry().vector_document_id(document_id)
+    per_question = [expand_query(question) for question in questions]
+    embeddings = reduce_embeddings(encode_queries([query for queries in per_question for query in queries])).tolist()
+    
+    matches = _query_all(store, [(embedding, {"document_id": vector_document_id}) for embedding in embeddings])
+    # Nothing indexed under this document_id - fall back to the whole index, again in one round trip
+    missing = [i for i, found in enumerate(matches) if not found]
+    if missing:
+        for i, found in zip(missing, _query_all(store, [(embeddings[i], None) for i in missing])):
+            matches[i] = found
+    
+    lexical = get_lexical_store().get(document_id) if settings.HYBRID_RETRIEVAL else None
+    
+    limit = settings.RERANK_CANDIDATES if settings.RERANK_ENABLED else settings.RETRIEVAL_MAX_CHUNKS
+    
+    results = []
+    cursor = 0
+    for question, queries in zip(questions, per_question):
+        lexical_ranked = None
+        if lexical is not None:
+            lexical_ranked = [lexical.passage(i) for i, _ in lexical.search(question, top_k=settings.RETRIEVAL_TOP_K_PER_QUERY)]
+        results.append(_fuse(matches[cursor:cursor + len(queries)], lexical_ranked, limit=limit))
+        cursor += len(queries)
+    
+    if settings.RERANK_ENABLED:
+        try:
+            results = rerank_batch(questions, results, top_n=settings.RERANK_TOP_N)
+        except Exception as e:
+            logging.error(f"Reranking failed, using fused order: {e}")
+            results = [fused[:settings.RETRIEVAL_MAX_CHUNKS] for fused in results]
+    return [[{"text": text, "score": score} for text, score in fused] for fused in results]
+
+def search_similar_chunks_batch(document_id, questions):
+    """Context chunk texts for every question, best first"""
+    return [[chunk["text"] for chunk in chunks] for chunks in search_scored_chunks_batch(document_id, questions)]
+
+def search_similar_chunks(document_id, question):
+    return search_similar_chunks_batch(document_id, [question])[0]
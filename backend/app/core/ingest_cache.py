@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.core.config import settings
+
+
+def content_digest(content: bytes) -> str:
+    """SHA-256 hex digest of raw document bytes"""
+    return hashlib.sha256(content).hexdigest()
+
+
+@dataclass
+class IngestEntry:
+    """Everything the ingestion pipeline derives from one document's bytes"""
+    text: str
+    chunks: Optional[List[str]] = None
+    chunk_pages: Optional[List[Optional[int]]] = None  # page each chunk starts on, when known
+    embeddings: Optional[dict] = None  # chunk text -> vector, for the chunks that needed encoding
+
+    def size_bytes(self) -> int:
+        size = len(self.text)
+        if self.chunks:
+            size += sum(len(chunk) for chunk in self.chunks)
+        if self.embeddings:
+            size += sum(getattr(vector, "nbytes", 0) for vector in self.embeddings.values())
+        return size
+
+
+class IngestCache:
+    """
+    Content-addressed LRU cache for the download -> parse -> chunk -> embed pipeline.
+    Entries are keyed by the SHA-256 of the downloaded bytes and evicted by total size.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, IngestEntry]" = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest: str) -> Optional[IngestEntry]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry
+
+    def put(self, digest: str, entry: IngestEntry) -> IngestEntry:
+        size = entry.size_bytes()
+        with self._lock:
+            if digest in self._entries:
+                self._total_bytes -= self._sizes.pop(digest)
+                del self._entries[digest]
+            if size > self.max_bytes:
+                # Too big to ever fit - don't flush the whole cache for it
+                return entry
+            self._entries[digest] = entry
+            self._sizes[digest] = size
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                old_digest, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_digest)
+                self.evictions += 1
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+ingest_cache = IngestCache(settings.INGEST_CACHE_MAX_BYTES)
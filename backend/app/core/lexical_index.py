@@ -0,0 +1,243 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.text_store import get_text_store
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from has have how i if in is it its
+    of on or so than that the their then there these this to under was what when where
+    which who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms minus stopwords; short terms like "ncd" are kept"""
+    return [term for term in _TOKEN_RE.findall(text.lower()) if term not in _STOPWORDS]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_RE.split(text) if sentence and sentence.strip()]
+
+
+def passage_spans(text: str, passages: Sequence[str]) -> Optional[np.ndarray]:
+    """(start, end) UTF-8 byte offsets of each passage in text, or None if one isn't a substring"""
+    spans = np.zeros((len(passages), 2), dtype=np.int64)
+    char_pos = byte_pos = 0
+    for i, passage in enumerate(passages):
+        # Chunks come in document order, so each search starts just past the previous hit
+        start = text.find(passage, char_pos + 1 if i else 0)
+        if start == -1:
+            start = text.find(passage)
+            if start == -1:
+                return None
+        if start >= char_pos:
+            byte_pos += len(text[char_pos:start].encode("utf-8"))
+        else:
+            byte_pos = len(text[:start].encode("utf-8"))
+        char_pos = start
+        spans[i] = (byte_pos, byte_pos + len(passage.encode("utf-8")))
+    return spans
+
+
+class LexicalIndex:
+    """
+    BM25 over a fixed list of passages. Postings are stored per term as parallel
+    (passage, weight) arrays with the BM25 term weight precomputed at build time,
+    so a query is one vectorised add per query term.
+
+    Given the document's text and its digest in the text store, the index keeps only
+    each passage's byte span and reads passages back from the mmap'd store on demand,
+    so cached indexes don't hold whole documents in memory.
+    """
+
+    def __init__(self, passages: Sequence[str], k1: float = 1.5, b: float = 0.75,
+                 text: str = None, digest: str = None):
+        counts = [Counter(tokenize(passage)) for passage in passages]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for passage_id, passage_counts in enumerate(counts):
+            for term, tf in passage_counts.items():
+                postings[term].append((passage_id, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        docs, weights = [], []
+        total = len(passages)
+        for i, term in enumerate(terms):
+            entries = postings[term]
+            idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            for passage_id, tf in entries:
+                norm = k1 * (1 - b + b * lengths[passage_id] / average)
+                docs.append(passage_id)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            offsets[i + 1] = len(docs)
+        self._set_arrays(terms, offsets, np.array(docs, dtype=np.int32), np.array(weights, dtype=np.float32))
+
+        spans = passage_spans(text, passages) if text is not None and digest is not None else None
+        if spans is not None:
+            self._set_passages(None, digest, spans)
+        else:
+            self._set_passages(list(passages), None, None)
+
+    def _set_passages(self, passages: Optional[List[str]], digest: Optional[str], spans: Optional[np.ndarray]):
+        self._passages = passages
+        self._digest = digest
+        self._spans = spans
+        self.passage_count = len(passages) if passages is not None else len(spans)
+
+    def passage(self, passage_id: int) -> str:
+        if self._passages is not None:
+            return self._passages[passage_id]
+        start, end = self._spans[passage_id]
+        return get_text_store().read(self._digest, int(start), int(end - start))
+
+    def _set_arrays(self, terms, offsets, docs, weights):
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+        self._offsets = offsets
+        self._docs = docs
+        self._weights = weights
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """(passage index, BM25 score) for the best top_k passages, best first"""
+        scores = np.zeros(self.passage_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self._term_ids.get(term)
+            if i is not None:
+                start, end = self._offsets[i], self._offsets[i + 1]
+                scores[self._docs[start:end]] += self._weights[start:end]
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return []
+        k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def top_passages(self, query: str, budget_chars: int) -> str:
+        """Best-scoring passages that fit in budget_chars, joined in document order"""
+        selected, used = [], 0
+        for passage_id, _ in self.search(query, top_k=max(1, budget_chars // 200)):
+            passage = self.passage(passage_id)
+            if used + len(passage) > budget_chars and selected:
+                break
+            selected.append((passage_id, passage))
+            used += len(passage)
+        return "\n".join(passage.strip() for _, passage in sorted(selected))
+
+    def save(self, path: str):
+        arrays = {
+            "terms": np.array(sorted(self._term_ids, key=self._term_ids.get), dtype=str),
+            "offsets": self._offsets, "docs": self._docs, "weights": self._weights,
+        }
+        if self._spans is not None:
+            arrays.update(digest=np.array(self._digest), spans=self._spans)
+        else:
+            # One byte buffer plus offsets - a fixed-width string array pads every passage to the longest
+            encoded = [passage.encode("utf-8") for passage in self._passages]
+            arrays.update(
+                passage_bytes=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                passage_offsets=np.cumsum([0] + [len(data) for data in encoded], dtype=np.int64),
+            )
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as data:
+            index = cls.__new__(cls)
+            index._set_arrays(data["terms"].tolist(), data["offsets"], data["docs"], data["weights"])
+            if "spans" in data.files:
+                index._set_passages(None, str(data["digest"]), data["spans"])
+            elif "passage_bytes" in data.files:
+                buffer, offsets = data["passage_bytes"].tobytes(), data["passage_offsets"]
+                index._set_passages([buffer[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])],
+                                    None, None)
+            else:
+                index._set_passages(data["passages"].tolist(), None, None)  # written by older versions
+        return index
+
+
+def best_sentences(question: str, text: str, max_sentences: int) -> List[str]:
+    """The sentences of text that best match the question under BM25, in document order"""
+    sentences = split_sentences(text)
+    if not sentences:
+        return []
+    hits = LexicalIndex(sentences).search(question, top_k=max_sentences)
+    return [sentences[i] for i, _ in sorted(hits)]
+
+
+class LexicalIndexStore:
+    """Per-document BM25 indexes on disk under DATA_DIR/lexical, with a small LRU in front"""
+
+    def __init__(self, directory: str, memory_items: int):
+        self.directory = directory
+        self.memory_items = memory_items
+        os.makedirs(directory, exist_ok=True)
+        self._memory: "OrderedDict[int, LexicalIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, document_id: int) -> str:
+        return os.path.join(self.directory, f"{document_id}.npz")
+
+    def _remember(self, document_id: int, index: LexicalIndex):
+        with self._lock:
+            self._memory[document_id] = index
+            self._memory.move_to_end(document_id)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, document_id: int) -> Optional[LexicalIndex]:
+        with self._lock:
+            index = self._memory.get(document_id)
+            if index is not None:
+                self._memory.move_to_end(document_id)
+                return index
+        path = self._path(document_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            index = LexicalIndex.load(path)
+        except Exception as e:
+            logging.error(f"Could not load lexical index for document {document_id}: {e}")
+            return None
+        self._remember(document_id, index)
+        return index
+
+    def put(self, document_id: int, index: LexicalIndex):
+        index.save(self._path(document_id))
+        self._remember(document_id, index)
+
+
+def build_lexical_index(document_id: int, chunks: Sequence[str], text: str = None,
+                        digest: str = None) -> LexicalIndex:
+    """Index a document's chunks unless some worker already has; text/digest locate them in the text store"""
+    store = get_lexical_store()
+    index = store.get(document_id)
+    if index is None:
+        index = LexicalIndex(chunks, text=text, digest=digest)
+        store.put(document_id, index)
+        logging.info(f"Built lexical index for document {document_id}: {len(index._term_ids)} terms")
+    return index
+
+
+_lexical_store = None
+
+
+def get_lexical_store() -> LexicalIndexStore:
+    global _lexical_store
+    if _lexical_store is None:
+        _lexical_store = LexicalIndexStore(os.path.join(settings.DATA_DIR, "lexical"), settings.LEXICAL_INDEX_MEMORY_ITEMS)
+    return _lexical_store
@@ -0,0 +1,65 @@
+import json
+import logging
+from typing import Dict, List
+
+from app.core.config import settings
+
+# Policy-wording variants for terms that questions phrase differently from the
+# document. Extended or overridden by QUERY_EXPANSION_FILE.
+DEFAULT_GLOSSARY: Dict[str, List[str]] = {
+    "grace period": [
+        "grace period premium payment thirty days",
+        "premium due date grace period days",
+        "renewal premium payment grace",
+    ],
+    "waiting period": [
+        "waiting period months continuous coverage from inception",
+        "specified disease waiting period exclusion",
+    ],
+    "pre-existing": [
+        "pre-existing disease waiting period continuous coverage",
+        "PED exclusion months of continuous coverage",
+    ],
+    "maternity": [
+        "maternity expenses childbirth lawful medical termination of pregnancy",
+        "maternity benefit waiting period deliveries",
+    ],
+    "cataract": ["cataract surgery waiting period limit"],
+    "organ donor": ["organ donor medical expenses harvesting transplantation"],
+    "no claim discount": ["no claim discount NCD renewal premium"],
+    "ncd": ["no claim discount NCD renewal premium"],
+    "health check": ["preventive health check-up reimbursement block of policy years"],
+    "hospital": ["hospital definition inpatient beds qualified nursing staff operation theatre"],
+    "ayush": ["AYUSH treatment Ayurveda Yoga Naturopathy Unani Siddha Homeopathy hospital"],
+    "room rent": ["room rent ICU charges sub-limit percentage of sum insured"],
+}
+
+_glossary = None
+
+
+def get_glossary() -> Dict[str, List[str]]:
+    global _glossary
+    if _glossary is None:
+        glossary = dict(DEFAULT_GLOSSARY)
+        if settings.QUERY_EXPANSION_FILE:
+            try:
+                with open(settings.QUERY_EXPANSION_FILE, encoding="utf-8") as f:
+                    glossary.update({term.lower(): list(variants) for term, variants in json.load(f).items()})
+            except Exception as e:
+                logging.error(f"Could not load query expansions from {settings.QUERY_EXPANSION_FILE}: {e}")
+        _glossary = glossary
+    return _glossary
+
+
+def expand_query(question: str) -> List[str]:
+    """
+    Search variants for a question: the question itself, then glossary phrasings for
+    any terms it mentions, capped at QUERY_EXPANSION_MAX_VARIANTS.
+    """
+    variants = [question]
+    if settings.QUERY_EXPANSION == "glossary":
+        lowered = question.lower()
+        for term, phrasings in get_glossary().items():
+            if term in lowered:
+                variants.extend(phrasings)
+    return list(dict.fromkeys(variants))[:max(1, settings.QUERY_EXPANSION_MAX_VARIANTS)]
@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Small CPU cross-encoder, loaded on first use
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_reranker():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+                started = time.perf_counter()
+                _model = CrossEncoder(settings.RERANK_MODEL, device="cpu", max_length=settings.RERANK_MAX_LENGTH)
+                logging.info(f"Loaded reranker {settings.RERANK_MODEL} in {time.perf_counter() - started:.2f}s")
+    return _model
+
+
+def warmup_reranker():
+    """Load the cross-encoder and score one pair so the first request keeps its whole budget"""
+    get_reranker().predict([("warmup", "warmup")])
+
+
+def rerank_batch(questions: Sequence[str], candidates: Sequence[Sequence[Tuple[str, float]]],
+                 top_n: int, budget_seconds: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+    """
+    Re-score each question's (text, fused score) candidates with the cross-encoder
+    and keep the best top_n. Pairs are scored in batches, best fused ranks of every
+    question first, until the time budget runs out; candidates left unscored keep
+    their fused order behind the scored ones. Returns (text, score) pairs where the
+    score is the cross-encoder logit, or the fused score if it wasn't reached.
+    """
+    budget_seconds = settings.RERANK_BUDGET_MS / 1000 if budget_seconds is None else budget_seconds
+    model = get_reranker()
+    # The budget is for scoring - loading the model on first use doesn't count against it
+    deadline = time.perf_counter() + budget_seconds
+
+    # (question index, candidate index) in rank-major order
+    depth = max((len(c) for c in candidates), default=0)
+    order = [(q, r) for r in range(depth) for q in range(len(questions)) if r < len(candidates[q])]
+    scores = [dict() for _ in questions]
+    batch_size = settings.RERANK_BATCH_SIZE
+    for start in range(0, len(order), batch_size):
+        if start and time.perf_counter() >= deadline:
+            logging.info(f"Rerank budget of {budget_seconds * 1000:.0f}ms spent after {start}/{len(order)} pairs")
+            break
+        batch = order[start:start + batch_size]
+        logits = model.predict([(questions[q], candidates[q][r][0]) for q, r in batch], batch_size=batch_size)
+        for (q, r), logit in zip(batch, logits):
+            scores[q][r] = float(logit)
+
+    results = []
+    for q, question_candidates in enumerate(candidates):
+        scored = sorted(scores[q].items(), key=lambda pair: pair[1], reverse=True)
+        ranked = [(question_candidates[r][0], score) for r, score in scored]
+        ranked += [candidate for r, candidate in enumerate(question_candidates) if r not in scores[q]]
+        results.append(ranked[:top_n])
+    return results
@@ -0,0 +1,156 @@
+import glob
+import heapq
+import logging
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class TextStore:
+    """
+    Extracted document text, one UTF-8 file per content digest, read back through mmap.
+    Files are written once and never change, so every worker can serve any document's
+    text, and callers pull only the spans they need - full-length documents never have
+    to sit in the Python heap.
+    """
+
+    def __init__(self, directory: str, open_maps: int = 64):
+        self.directory = directory
+        self.open_maps = open_maps
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps: "OrderedDict[str, Optional[mmap.mmap]]" = OrderedDict()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.txt")
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def put(self, digest: str, text: str) -> int:
+        """Store a document's text unless some worker already has; returns its length in bytes"""
+        path = self._path(digest)
+        if os.path.exists(path):
+            return os.path.getsize(path)
+        data = text.encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self._path(digest))
+
+    def _view(self, digest: str) -> Optional[mmap.mmap]:
+        with self._lock:
+            if digest in self._maps:
+                self._maps.move_to_end(digest)
+                return self._maps[digest]
+            with open(self._path(digest), "rb") as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+            self._maps[digest] = view
+            # Evicted maps may still be in use by readers; they are freed once unreferenced
+            while len(self._maps) > self.open_maps:
+                self._maps.popitem(last=False)
+            return view
+
+    def read(self, digest: str, offset: int = 0, length: int = None) -> str:
+        view = self._view(digest)
+        if view is None:
+            return ""
+        end = len(view) if length is None else offset + length
+        return view[offset:end].decode("utf-8", errors="ignore")
+
+    def iter_windows(self, digest: str, window_bytes: int) -> Iterator[str]:
+        """Yield the stored text in ~window_bytes pieces, cut at line breaks where possible"""
+        view = self._view(digest)
+        if view is None:
+            return
+        end = len(view)
+        start = 0
+        while start < end:
+            stop = min(start + window_bytes, end)
+            if stop < end:
+                newline = view.find(b"\n", stop, min(stop + window_bytes // 2, end))
+                if newline != -1:
+                    stop = newline + 1
+            yield view[start:stop].decode("utf-8", errors="ignore")
+            start = stop
+
+
+def iter_text_windows(text: str, window_chars: int) -> Iterator[str]:
+    """In-memory counterpart of TextStore.iter_windows"""
+    start = 0
+    while start < len(text):
+        stop = min(start + window_chars, len(text))
+        if stop < len(text):
+            newline = text.find("\n", stop, stop + window_chars // 2)
+            if newline != -1:
+                stop = newline + 1
+        yield text[start:stop]
+        start = stop
+
+
+def select_relevant_spans(windows: Iterable[str], question: str, budget_chars: int,
+                          window_chars: int) -> str:
+    """
+    Keep the windows that share the most keywords with the question, up to budget_chars,
+    and return them in document order. Only the winning windows are held in memory.
+    """
+    max_windows = budget_chars // max(1, window_chars) + 1
+    keywords = {word for word in _WORD_RE.findall(question.lower()) if len(word) > 3}
+    best: List[Tuple[int, int, str]] = []  # min-heap of (score, -position, text)
+    first_window = ""
+    for position, window in enumerate(windows):
+        if position == 0:
+            first_window = window
+        lowered = window.lower()
+        score = sum(lowered.count(keyword) for keyword in keywords)
+        if score == 0:
+            continue
+        item = (score, -position, window)
+        if len(best) < max_windows:
+            heapq.heappush(best, item)
+        elif item > best[0]:
+            heapq.heapreplace(best, item)
+
+    if not best:
+        return first_window[:budget_chars]
+
+    selected, used = [], 0
+    for score, neg_position, window in sorted(best, reverse=True):
+        if used + len(window) > budget_chars and selected:
+            break
+        selected.append((-neg_position, window))
+        used += len(window)
+    return "\n".join(window.strip() for _, window in sorted(selected))
+
+
+def remove_stale_stores(directory: str):
+    """Delete the per-process text stores older versions wrote (documents-<pid>.txt)"""
+    for path in glob.glob(os.path.join(directory, "documents-*.txt")):
+        try:
+            os.remove(path)
+            logging.info(f"Removed stale text store {path}")
+        except OSError as e:
+            logging.warning(f"Could not remove stale text store {path}: {e}")
+
+
+_text_store = None
+
+
+def get_text_store() -> TextStore:
+    global _text_store
+    if _text_store is None:
+        directory = os.path.join(settings.DATA_DIR, "text")
+        remove_stale_stores(directory)
+        _text_store = TextStore(directory)
+    return _text_store
@@ -0,0 +1,545 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.dimension_reduction import index_dimension, index_tag
+
+
+class VectorStore:
+    """
+    What ingestion and retrieval need from a vector index. Vectors are dicts with
+    "id", "values" and "metadata"; matches are dicts with "id", "score" and "metadata".
+    """
+
+    persistent = True  # outlives the process, and is shared with the other workers
+
+    def upsert(self, vectors: List[dict]):
+        raise NotImplementedError
+
+    def query(self, vector, top_k: int, filter: Optional[dict] = None) -> List[dict]:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    def delete_where(self, filter: dict):
+        """Delete every vector whose metadata matches filter (for indexes that can't list IDs)"""
+        raise NotImplementedError
+
+    def list_ids(self, prefix: str) -> Optional[List[str]]:
+        """IDs starting with prefix, or None if this index can't list IDs"""
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """Remote Pinecone index"""
+
+    def __init__(self):
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+        self.index = pc.Index(settings.PINECONE_INDEX, host=settings.PINECONE_HOST)
+
+    def upsert(self, vectors: List[dict]):
+        self.index.upsert(vectors)
+
+    def query(self, vector, top_k: int, filter: Optional[dict] = None) -> List[dict]:
+        kwargs = {"filter": filter} if filter else {}
+        results = self.index.query(vector=list(vector), top_k=top_k, include_metadata=True, **kwargs)
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": match.get("metadata") or {}}
+            for match in results["matches"]
+        ]
+
+    def delete(self, ids: List[str]):
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000])
+
+    def delete_where(self, filter: dict):
+        self.index.delete(filter=filter)
+
+    def list_ids(self, prefix: str) -> Optional[List[str]]:
+        ids = []
+        try:
+            for id_page in self.index.list(prefix=prefix):
+                ids.extend(id_page)
+        except Exception as e:
+            # Pod-based indexes can't list IDs - callers fall back to metadata-filtered deletes
+            logging.warning(f"Could not list vector IDs with prefix {prefix}, falling back to a full re-sync: {e}")
+            return None
+        return ids
+
+
+def _matches_filter(metadata: dict, filter: dict) -> bool:
+    """Subset of Pinecone's metadata filter language: equality, $eq, $ne, $in, $nin"""
+    for field, condition in filter.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+    return True
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process index: unit-normalised vectors in one contiguous float32 matrix, so a
+    query is a single matrix-vector product plus argpartition for top-k. document_id
+    is mirrored into a numpy column so the common filter is vectorised too.
+    """
+
+    persistent = False
+
+    def __init__(self, dimension: int, capacity: int = 1024):
+        self.dimension = dimension
+        self._matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._document_ids = np.full(capacity, -1, dtype=np.int64)
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._metadata: List[Optional[dict]] = [None] * capacity
+        self._row_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0  # rows ever used (high-water mark)
+        self._lock = threading.RLock()
+
+    def _grow(self):
+        capacity = self._matrix.shape[0] * 2
+        matrix = np.zeros((capacity, self.dimension), dtype=self._matrix.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        self._document_ids = np.concatenate(
+            [self._document_ids, np.full(capacity - len(self._document_ids), -1, dtype=np.int64)]
+        )
+        self._ids.extend([None] * (capacity - len(self._ids)))
+        self._metadata.extend([None] * (capacity - len(self._metadata)))
+
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._size == self._matrix.shape[0]:
+            self._grow()
+        self._size += 1
+        return self._size - 1
+
+    @staticmethod
+    def _normalize(values) -> np.ndarray:
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def upsert(self, vectors: List[dict]):
+        with self._lock:
+            for vector in vectors:
+                row = self._row_of.get(vector["id"])
+                if row is None:
+                    row = self._allocate_row()
+                    self._row_of[vector["id"]] = row
+                metadata = dict(vector.get("metadata") or {})
+                self._matrix[row] = self._normalize(vector["values"])
+                self._alive[row] = True
+                self._ids[row] = vector["id"]
+                self._metadata[row] = metadata
+                document_id = metadata.get("document_id")
+                self._document_ids[row] = document_id if isinstance(document_id, int) else -1
+
+    def query(self, vector, top_k: int, filter: Optional[dict] = None) -> List[dict]:
+        query = self._normalize(vector)
+        with self._lock:
+            mask = self._alive[:self._size].copy()
+            filter = dict(filter or {})
+            document_id = filter.get("document_id")
+            if isinstance(document_id, int):
+                mask &= self._document_ids[:self._size] == document_id
+                del filter["document_id"]
+            rows = np.flatnonzero(mask)
+            if filter:
+                rows = np.array([r for r in rows if _matches_filter(self._metadata[r], filter)], dtype=np.int64)
+            if len(rows) == 0:
+                return []
+            scores = self._matrix[rows] @ query
+            k = min(top_k, len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [
+                {"id": self._ids[rows[i]], "score": float(scores[i]), "metadata": self._metadata[rows[i]]}
+                for i in best
+            ]
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for vector_id in ids:
+                row = self._row_of.pop(vector_id, None)
+                if row is None:
+                    continue
+                self._alive[row] = False
+                self._ids[row] = None
+                self._metadata[row] = None
+                self._document_ids[row] = -1
+                self._free.append(row)
+
+    def list_ids(self, prefix: str) -> List[str]:
+        with self._lock:
+            return [vector_id for vector_id in self._row_of if vector_id.startswith(prefix)]
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Persistent index on local disk, shared by every worker on the node:
+
+      vectors.<dtype>  append-only rows of unit vectors (float16, or int8 scaled by 127)
+      vectors.meta     append-only JSON metadata blobs, read back through mmap
+      vectors.jsonl    op log: {"op": "add", "row", "id", "doc", "meta": [offset, length]}
+                       and {"op": "del", "id"}
+
+    Opening the index maps the vector file and replays the small op log, so a restart
+    doesn't re-embed anything. Workers pick up each other's appends on the next call,
+    and the OS page cache holds one copy of the vectors for all of them. Writers take
+    an exclusive flock; dead rows are dropped by compact().
+    """
+
+    def __init__(self, directory: str, dimension: int, dtype: str = "float16",
+                 compact_ratio: float = 0.5):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector index dtype: {dtype}")
+        os.makedirs(directory, exist_ok=True)
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.scale = 127.0 if dtype == "int8" else 1.0
+        self.row_bytes = dimension * self.dtype.itemsize
+        self.compact_ratio = compact_ratio
+        self.vectors_path = os.path.join(directory, f"vectors.{dtype}")
+        self.meta_path = os.path.join(directory, "vectors.meta")
+        self.log_path = os.path.join(directory, "vectors.jsonl")
+        self.lock_path = os.path.join(directory, "vectors.lock")
+        self._lock = threading.RLock()
+        for path in (self.vectors_path, self.meta_path, self.log_path, self.lock_path):
+            open(path, "ab").close()
+        self._reset_state()
+        started = time.perf_counter()
+        self._refresh()
+        logging.info(f"Mapped {len(self._row_of)} vectors from {directory} in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def _reset_state(self):
+        self._row_of: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._meta_refs: List[Optional[tuple]] = []
+        self._alive: List[bool] = []
+        self._doc_ids: List[int] = []
+        self._arrays = None  # numpy copies of _alive/_doc_ids, rebuilt after changes
+        self._log_offset = 0
+        self._log_inode = None
+        self._vectors = None
+        self._rows = 0
+        self._meta_view = None
+        self._meta_size = 0
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        with open(self.lock_path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self, locked: bool = False):
+        """Apply whatever other workers appended (or a compaction they ran) since last call"""
+        if not locked:
+            with self._file_lock(exclusive=False):
+                return self._refresh(locked=True)
+        stat = os.stat(self.log_path)
+        if self._log_inode is not None and (stat.st_ino != self._log_inode or stat.st_size < self._log_offset):
+            self._reset_state()
+        self._log_inode = stat.st_ino
+        if stat.st_size > self._log_offset:
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read(stat.st_size - self._log_offset)
+            complete = data.rfind(b"\n") + 1  # ignore a half-written trailing line
+            for line in data[:complete].splitlines():
+                if line:
+                    self._apply(json.loads(line))
+            self._log_offset += complete
+            self._arrays = None
+        rows = os.path.getsize(self.vectors_path) // self.row_bytes
+        if rows != self._rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r",
+                                      shape=(rows, self.dimension)) if rows else None
+            self._rows = rows
+        meta_size = os.path.getsize(self.meta_path)
+        if meta_size != self._meta_size:
+            # Mapped here, under the lock, so rows and their metadata always come from the same files
+            with open(self.meta_path, "rb") as f:
+                self._meta_view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if meta_size else None
+            self._meta_size = meta_size
+
+    def _apply(self, record: dict):
+        if record["op"] == "add":
+            row = record["row"]
+            while len(self._ids) <= row:
+                self._ids.append(None)
+                self._meta_refs.append(None)
+                self._alive.append(False)
+                self._doc_ids.append(-1)
+            previous = self._row_of.get(record["id"])
+            if previous is not None:
+                self._alive[previous] = False
+            self._row_of[record["id"]] = row
+            self._ids[row] = record["id"]
+            self._meta_refs[row] = tuple(record["meta"])
+            self._alive[row] = True
+            self._doc_ids[row] = record["doc"] if isinstance(record.get("doc"), int) else -1
+        elif record["op"] == "del":
+            row = self._row_of.pop(record["id"], None)
+            if row is not None:
+                self._alive[row] = False
+
+    def _metadata_bytes(self, row: int) -> bytes:
+        offset, length = self._meta_refs[row]
+        return self._meta_view[offset:offset + length]
+
+    def _metadata(self, row: int) -> dict:
+        return json.loads(self._metadata_bytes(row))
+
+    def _encode(self, values) -> np.ndarray:
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        if self.dtype == np.int8:
+            return np.clip(np.round(vector * self.scale), -127, 127).astype(np.int8)
+        return vector.astype(self.dtype)
+
+    def _append_log(self, records: List[dict]):
+        with open(self.log_path, "ab") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+
+    def upsert(self, vectors: List[dict]):
+        if not vectors:
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh(locked=True)
+            rows = np.stack([self._encode(vector["values"]) for vector in vectors])
+            metas = [json.dumps(vector.get("metadata") or {}).encode("utf-8") for vector in vectors]
+            with open(self.vectors_path, "r+b") as f:
+                start_row = os.path.getsize(self.vectors_path) // self.row_bytes
+                f.seek(start_row * self.row_bytes)  # drop any torn partial row
+                f.write(rows.tobytes())
+                f.truncate()
+            with open(self.meta_path, "ab") as f:
+                meta_offset = f.tell()
+                f.write(b"".join(metas))
+            records = []
+            for i, (vector, meta) in enumerate(zip(vectors, metas)):
+                document_id = (vector.get("metadata") or {}).get("document_id")
+                records.append({"op": "add", "row": start_row + i, "id": vector["id"],
+                                 "doc": document_id if isinstance(document_id, int) else None,
+                                 "meta": [meta_offset, len(meta)]})
+                meta_offset += len(meta)
+            self._append_log(records)
+            self._refresh(locked=True)
+            self._maybe_compact()
+
+    def delete(self, ids: List[str]):
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh(locked=True)
+            records = [{"op": "del", "id": vector_id} for vector_id in ids if vector_id in self._row_of]
+            if records:
+                self._append_log(records)
+                self._refresh(locked=True)
+                self._maybe_compact()
+
+    def query(self, vector, top_k: int, filter: Optional[dict] = None) -> List[dict]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        # Shared lock for the whole query - a compaction can't swap the files mid-read
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh(locked=True)
+            if self._vectors is None:
+                return []
+            if self._arrays is None:
+                self._arrays = (np.array(self._alive, dtype=bool), np.array(self._doc_ids, dtype=np.int64))
+            alive, doc_ids = self._arrays
+            limit = min(self._rows, len(alive))
+            mask = alive[:limit].copy()
+            filter = dict(filter or {})
+            document_id = filter.get("document_id")
+            if isinstance(document_id, int):
+                mask &= doc_ids[:limit] == document_id
+                del filter["document_id"]
+            rows = np.flatnonzero(mask)
+            if filter:
+                rows = np.array([r for r in rows if _matches_filter(self._metadata(r), filter)], dtype=np.int64)
+            if len(rows) == 0:
+                return []
+            scores = (np.asarray(self._vectors[rows], dtype=np.float32) @ query) / self.scale
+            k = min(top_k, len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [
+                {"id": self._ids[rows[i]], "score": float(scores[i]), "metadata": self._metadata(rows[i])}
+                for i in best
+            ]
+
+    def list_ids(self, prefix: str) -> List[str]:
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh(locked=True)
+            return [vector_id for vector_id in self._row_of if vector_id.startswith(prefix)]
+
+    def _maybe_compact(self):
+        dead = self._rows - len(self._row_of)
+        if self._rows >= 1000 and dead > self.compact_ratio * self._rows:
+            self._compact_locked()
+
+    def compact(self):
+        """Rewrite the index with live rows only"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh(locked=True)
+            self._compact_locked()
+
+    def _compact_locked(self):
+        started = time.perf_counter()
+        live = sorted(self._row_of.items(), key=lambda item: item[1])
+        tmp_vectors, tmp_meta, tmp_log = (path + ".compact" for path in (self.vectors_path, self.meta_path, self.log_path))
+        records = []
+        meta_offset = 0
+        with open(tmp_vectors, "wb") as vf, open(tmp_meta, "wb") as mf:
+            for new_row, (vector_id, row) in enumerate(live):
+                vf.write(np.asarray(self._vectors[row]).tobytes())
+                meta = self._metadata_bytes(row)
+                mf.write(meta)
+                doc = self._doc_ids[row]
+                records.append({"op": "add", "row": new_row, "id": vector_id,
+                                "doc": doc if doc >= 0 else None, "meta": [meta_offset, len(meta)]})
+                meta_offset += len(meta)
+        with open(tmp_log, "wb") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+        # Readers hold the shared lock for as long as they read, so they never see a mix of files
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_meta, self.meta_path)
+        os.replace(tmp_log, self.log_path)
+        dropped = self._rows - len(live)
+        self._reset_state()
+        self._refresh(locked=True)
+        logging.info(f"Compacted vector index: dropped {dropped} dead rows in {time.perf_counter() - started:.2f}s")
+
+
+def _payload_bytes(vector: dict) -> int:
+    """Rough request size of one vector: ~12 bytes per serialised float plus metadata"""
+    return len(vector["values"]) * 12 + len(json.dumps(vector.get("metadata") or {})) + len(vector["id"]) + 64
+
+
+def iter_upsert_batches(vectors: List[dict], max_count: int, max_bytes: int) -> Iterator[List[dict]]:
+    """Split vectors into batches under both a vector-count and a payload-size limit"""
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        size = _payload_bytes(vector)
+        if batch and (len(batch) >= max_count or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def _upsert_with_retry(store: VectorStore, batch: List[dict]) -> int:
+    for attempt in range(settings.UPSERT_MAX_RETRIES + 1):
+        try:
+            store.upsert(batch)
+            return len(batch)
+        except Exception as e:
+            if attempt == settings.UPSERT_MAX_RETRIES:
+                raise
+            delay = settings.UPSERT_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+            logging.warning(f"Upsert of {len(batch)} vectors failed ({e}), retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+_upsert_pool = None
+
+
+def _get_upsert_pool() -> ThreadPoolExecutor:
+    global _upsert_pool
+    if _upsert_pool is None:
+        _upsert_pool = ThreadPoolExecutor(max_workers=settings.UPSERT_CONCURRENCY, thread_name_prefix="vector-upsert")
+    return _upsert_pool
+
+
+def batched_upsert(store: VectorStore, vectors: List[dict],
+                   on_progress: Callable[[int, int], None] = None) -> int:
+    """
+    Upsert vectors in count- and size-limited batches, at most UPSERT_CONCURRENCY in
+    flight, retrying each failed batch with jittered exponential backoff.
+    on_progress(upserted, total) is called as batches land. Raises if a batch still
+    fails after its retries; batches already sent stay in the index.
+    """
+    total = len(vectors)
+    upserted = 0
+    pool = _get_upsert_pool()
+    pending = set()
+
+    def collect(futures):
+        nonlocal upserted
+        for future in futures:
+            upserted += future.result()
+            if on_progress:
+                on_progress(upserted, total)
+
+    try:
+        for batch in iter_upsert_batches(vectors, settings.UPSERT_BATCH_SIZE, settings.UPSERT_BATCH_MAX_BYTES):
+            if len(pending) >= settings.UPSERT_CONCURRENCY:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(_upsert_with_retry, store, batch))
+        finished, pending = wait(pending)
+        collect(finished)
+    except Exception:
+        for future in pending:
+            future.cancel()
+        raise
+    return upserted
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.VECTOR_STORE == "pinecone":
+                    _store = PineconeVectorStore()
+                elif settings.VECTOR_STORE == "numpy":
+                    _store = NumpyVectorStore(index_dimension())
+                elif settings.VECTOR_STORE == "mmap":
+                    _store = MmapVectorStore(
+                        os.path.join(settings.DATA_DIR, f"vectors{index_tag()}"), index_dimension(),
+                        dtype=settings.VECTOR_INDEX_DTYPE, compact_ratio=settings.VECTOR_INDEX_COMPACT_RATIO,
+                    )
+                else:
+                    raise ValueError(f"Unknown VECTOR_STORE: {settings.VECTOR_STORE}")
+                logging.info(f"Using {type(_store).__name__}")
+    return _store
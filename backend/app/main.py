@@ -1,11 +1,14 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 # Import only the minimal API routes
-from app.api.v1.endpoints import router as hackrx_router
+from app.api.v1.endpoints import router as hackrx_router, SERVICES_AVAILABLE
+from app.services.fetcher import close_http_client
+from app.services.llm_client import close_llm_http_client
 
 app = FastAPI(title="HackRx 6.0 Query Retrieval System - Lightweight")
 
@@ -20,6 +23,36 @@ app.add_middleware(
 # Include only the essential router
 app.include_router(hackrx_router)
 
+@app.on_event("startup")
+async def startup():
+    from app.core.config import settings
+    if SERVICES_AVAILABLE:
+        # Spawn the PDF extraction workers now rather than from a busy executor thread later
+        from app.services.document_processor import start_pdf_pool
+        start_pdf_pool()
+        # Opening the shared text store also clears per-process stores older versions left behind
+        from app.core.text_store import get_text_store
+        get_text_store()
+    if SERVICES_AVAILABLE and settings.EMBEDDING_WARMUP:
+        # Load the encoder before taking traffic instead of on the first request
+        from app.core.embeddings import warmup_model
+        await asyncio.get_running_loop().run_in_executor(None, warmup_model)
+        if settings.RERANK_ENABLED:
+            from app.core.reranker import warmup_reranker
+            await asyncio.get_running_loop().run_in_executor(None, warmup_reranker)
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Drain the pooled document-download connections
+    await close_http_client()
+    await close_llm_http_client()
+    if SERVICES_AVAILABLE:
+        # Stop background ingestion workers
+        from app.services.jobs import job_manager
+        await job_manager.stop()
+        from app.services.document_processor import shutdown_pdf_pool
+        shutdown_pdf_pool()
+
 @app.get("/")
 def read_root():
     return {"message": "HackRx 6.0 API is running", "status": "healthy"} 
\ No newline at end of file
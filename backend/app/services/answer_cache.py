@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.lexical_index import tokenize
+from app.services.llm_client import DegradedAnswer
+
+
+_NEGATIONS = frozenset("""
+    not no never without except excluding excluded exclude non neither nor cannot
+    isn aren doesn don didn wasn weren won hasn haven
+""".split())
+# Question phrasing rather than content - "how long is the grace period" asks for the grace period
+_PHRASING = frozenset("""
+    long much many tell explain describe please give know mean define definition exactly also
+""".split())
+_SUFFIXES = ("ment", "ing", "age", "ed")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CAPITALISED_RE = re.compile(r"(?<=\s)[A-Z][A-Za-z0-9]*")
+
+
+def _stem(term: str) -> str:
+    """Crude suffix stripping so "payment", "paying" and "pay" compare equal"""
+    if len(term) > 3 and term.endswith("s") and not term.endswith(("ss", "us")):
+        term = term[:-1]
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+class KeyTerms(NamedTuple):
+    """
+    What a question asks about, beyond what its embedding captures: embeddings rate
+    "waiting period for cataract" and "... for hernia" as near-duplicates.
+    """
+    content: frozenset      # stemmed terms minus stopwords and phrasing words
+    numbers: frozenset
+    entities: frozenset     # capitalised words after the first, lowercased ("plan a" -> "a")
+    negated: bool
+
+    def compatible(self, other: "KeyTerms") -> bool:
+        """
+        Whether the two questions may share an answer: same numbers, same negation, every
+        named entity mentioned by both, and overlapping content terms where at most one
+        side adds terms - two questions each with a term the other lacks ask about
+        different things (cataract vs hernia), while "for premium payment" vs "for
+        premium payment under this policy" is a paraphrase.
+        """
+        if self.numbers != other.numbers or self.negated != other.negated:
+            return False
+        if not self.entities <= other.content | other.entities or not other.entities <= self.content | self.entities:
+            return False
+        if self.content - other.content and other.content - self.content:
+            return False
+        union = self.content | other.content
+        return not union or len(self.content & other.content) >= 0.5 * len(union)
+
+    def encode(self) -> str:
+        return " ".join(sorted(self.content) + [f"#{n}" for n in sorted(self.numbers)]
+                        + [f"@{e}" for e in sorted(self.entities)] + (["!"] if self.negated else []))
+
+    @classmethod
+    def decode(cls, encoded: str) -> "KeyTerms":
+        tokens = encoded.split()
+        return cls(frozenset(t for t in tokens if t[0] not in "#@!"), frozenset(t[1:] for t in tokens if t[0] == "#"),
+                   frozenset(t[1:] for t in tokens if t[0] == "@"), "!" in tokens)
+
+
+def question_terms(question: str) -> KeyTerms:
+    terms = _WORD_RE.findall(question.lower())
+    content = set()
+    for term in tokenize(question):
+        stem = _stem(term)
+        if not any(c.isdigit() for c in term) and len(term) > 1 and term not in _PHRASING and stem not in _PHRASING:
+            content.add(stem)
+    return KeyTerms(
+        content=frozenset(content),
+        numbers=frozenset(term for term in terms if any(c.isdigit() for c in term)),
+        entities=frozenset(_stem(word.lower()) for word in _CAPITALISED_RE.findall(question)),
+        negated=any(term in _NEGATIONS for term in terms),
+    )
+
+
+class _Scope:
+    """In-memory copy of one (namespace, document digest) slice of the cache"""
+
+    def __init__(self, ids, vectors, terms, answers, created):
+        self.ids = ids
+        self.vectors = vectors      # (n, dim) float32, unit rows
+        self.terms = terms          # KeyTerms of each stored question
+        self.answers = answers
+        self.created = created      # np.float64 timestamps
+        self.loaded_at = time.time()
+
+
+class AnswerCache:
+    """
+    Semantic answer cache shared by all workers through a SQLite file. Entries are
+    scoped to a document's content digest, so a changed document never matches old
+    answers. Within a scope the stored question closest to the new one (cosine) among
+    those with compatible key terms (see KeyTerms) is reused if it clears the similarity
+    threshold and is younger than the TTL; the least recently used entries are evicted
+    past max_entries.
+    """
+
+    def __init__(self, path: str, threshold: float, ttl_seconds: int, max_entries: int,
+                 memory_scopes: int = 256):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_scopes = memory_scopes
+        self._scopes: "OrderedDict[str, _Scope]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+            if columns and "terms" not in columns:
+                # Entries from before key-term matching can't be checked - it's only a cache
+                conn.execute("DROP TABLE answers")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, question TEXT NOT NULL,"
+                " terms TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL,"
+                " created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_used_at ON answers (used_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _load(self, scope: str) -> _Scope:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, vector, terms, answer, created_at FROM answers WHERE scope = ? AND created_at > ?",
+                (scope, time.time() - self.ttl_seconds),
+            ).fetchall()
+        if rows:
+            vectors = np.vstack([np.frombuffer(row[1], dtype=np.float16) for row in rows]).astype(np.float32)
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        return _Scope([row[0] for row in rows], vectors, [KeyTerms.decode(row[2]) for row in rows], [row[3] for row in rows],
+                      np.array([row[4] for row in rows], dtype=np.float64))
+
+    def _scope(self, scope: str) -> _Scope:
+        with self._lock:
+            entry = self._scopes.get(scope)
+            # Other workers add answers too - re-read a scope that's more than a few seconds old
+            if entry is not None and time.time() - entry.loaded_at < settings.ANSWER_CACHE_REFRESH_SECONDS:
+                self._scopes.move_to_end(scope)
+                return entry
+        entry = self._load(scope)
+        with self._lock:
+            self._scopes[scope] = entry
+            self._scopes.move_to_end(scope)
+            while len(self._scopes) > self.memory_scopes:
+                self._scopes.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _unit(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def get_many(self, scope: str, questions: Sequence[str], vectors) -> List[Optional[str]]:
+        """Cached answer for each question, None where nothing is close enough"""
+        entry = self._scope(scope)
+        found: List[Optional[str]] = [None] * len(vectors)
+        if len(entry.ids):
+            similarity = self._unit(vectors) @ entry.vectors.T
+            fresh_after = time.time() - self.ttl_seconds
+            used = []
+            for i, question in enumerate(questions):
+                asked = question_terms(question)
+                rows = [row for row, terms in enumerate(entry.terms) if asked.compatible(terms)]
+                if not rows:
+                    continue
+                row = rows[int(similarity[i, rows].argmax())]
+                if similarity[i, row] >= self.threshold and entry.created[row] > fresh_after:
+                    found[i] = entry.answers[row]
+                    used.append(entry.ids[row])
+            if used:
+                with self._connect() as conn:
+                    conn.executemany("UPDATE answers SET used_at = ? WHERE id = ?", [(time.time(), i) for i in used])
+        with self._lock:
+            hits = sum(answer is not None for answer in found)
+            self.hits += hits
+            self.misses += len(found) - hits
+        return found
+
+    def put_many(self, scope: str, questions: Sequence[str], vectors, answers: Sequence[str]):
+        if not questions:
+            return
+        now = time.time()
+        unit = self._unit(vectors)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO answers (scope, question, terms, vector, answer, created_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(scope, q, question_terms(q).encode(), v.astype(np.float16).tobytes(), a, now, now)
+                 for q, v, a in zip(questions, unit, answers)],
+            )
+            conn.execute("DELETE FROM answers WHERE created_at <= ?", (now - self.ttl_seconds,))
+            overflow = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY used_at LIMIT ?)", (overflow,)
+                )
+        with self._lock:
+            # Next lookup in this scope re-reads it, picking up the new rows
+            self._scopes.pop(scope, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "scopes_in_memory": len(self._scopes),
+            }
+
+
+_answer_cache = None
+
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache(
+            os.path.join(settings.DATA_DIR, "answers.sqlite3"),
+            threshold=settings.ANSWER_CACHE_THRESHOLD,
+            ttl_seconds=settings.ANSWER_CACHE_TTL,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+        )
+    return _answer_cache
+
+
+class AnswerLookup:
+    """One request's trip through the answer cache: hits up front, fresh answers stored after"""
+
+    def __init__(self, scope: str, questions: Sequence[str], vectors: np.ndarray, answers: List[Optional[str]]):
+        self.scope = scope
+        self.questions = questions
+        self.vectors = vectors
+        self.answers = answers  # cached answer per question, None on a miss
+
+    @property
+    def missing(self) -> List[int]:
+        return [i for i, answer in enumerate(self.answers) if answer is None]
+
+    async def store(self, indices: Sequence[int], answers: Sequence[str]):
+        """Cache freshly produced answers for these question indices, skipping degraded ones"""
+        keep = [(i, answer) for i, answer in zip(indices, answers) if answer and not isinstance(answer, DegradedAnswer)]
+        if not keep:
+            return
+        positions = [i for i, _ in keep]
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, get_answer_cache().put_many, self.scope, [self.questions[i] for i in positions],
+                self.vectors[positions], [answer for _, answer in keep],
+            )
+        except Exception as e:
+            logging.error(f"Could not store answers in the cache: {e}")
+
+
+async def lookup_answers(namespace: str, digest: Optional[str], questions: Sequence[str]) -> Optional[AnswerLookup]:
+    """
+    Look questions about the document with this digest up in the answer cache.
+    namespace keeps answers from differently-prompted endpoints apart. None when the
+    cache is off, the digest is unknown or the lookup fails.
+    """
+    if not settings.ANSWER_CACHE_ENABLED or not digest or not questions:
+        return None
+
+    from app.core.embeddings import encode_texts
+    scope = f"{namespace}:{settings.EMBEDDING_MODEL}:{digest}"
+    loop = asyncio.get_running_loop()
+    try:
+        vectors = await loop.run_in_executor(None, encode_texts, list(questions))
+        answers = await loop.run_in_executor(None, get_answer_cache().get_many, scope, questions, vectors)
+    except Exception as e:
+        logging.error(f"Answer cache lookup failed, answering without it: {e}")
+        return None
+    lookup = AnswerLookup(scope, questions, vectors, answers)
+    logging.info(f"Answer cache: {len(questions) - len(lookup.missing)}/{len(questions)} questions served from cache")
+    return lookup
+
+
+async def answer_with_cache(namespace: str, digest: Optional[str], questions: Sequence[str],
+                            answer_all: Callable[[List[int]], Awaitable[List[str]]]) -> List[str]:
+    """
+    Serve questions from the answer cache where possible; answer_all(indices)
+    produces the rest, which are cached unless degraded.
+    """
+    lookup = await lookup_answers(namespace, digest, questions)
+    if lookup is None:
+        return await answer_all(list(range(len(questions))))
+
+    answers = list(lookup.answers)
+    missing = lookup.missing
+    if missing:
+        fresh = await answer_all(missing)
+        for i, answer in zip(missing, fresh):
+            answers[i] = answer
+        await lookup.store(missing, fresh)
+    return answers
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence
+
+from app.services.llm_client import DegradedAnswer
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+_DONE = object()
+
+
+def stream_format(requested: Optional[str], accept: Optional[str]) -> Optional[str]:
+    """The stream format a request opted into (?stream=ndjson|sse or an Accept header), else None"""
+    if requested:
+        requested = requested.lower()
+        if requested not in STREAM_FORMATS:
+            raise ValueError(f"Unknown stream format '{requested}', expected one of {', '.join(STREAM_FORMATS)}")
+        return requested
+    for name, media_type in STREAM_FORMATS.items():
+        if media_type in (accept or ""):
+            return name
+    return None
+
+
+def format_event(event: dict, fmt: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def stream_answers(questions: Sequence[str], answer_stream: Callable[[int], AsyncIterator[str]],
+                         cached: Optional[List[Optional[str]]] = None,
+                         on_answer: Callable[[int, str], Awaitable[None]] = None) -> AsyncIterator[dict]:
+    """
+    Answer all questions concurrently, yielding events as soon as they happen:
+    {"type": "delta", "index", "delta"} for each piece of generated text,
+    {"type": "answer", "index", "answer", "degraded", "cached"} once a question is done
+    (cached answers come first), and finally {"type": "done", "answers"} with every
+    answer in question order - the same list the JSON response would carry.
+    on_answer(index, answer) runs for each freshly finished answer.
+    """
+    answers: List[Optional[str]] = list(cached) if cached else [None] * len(questions)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    for i, answer in enumerate(answers):
+        if answer is not None:
+            yield {"type": "answer", "index": i, "answer": answer, "degraded": False, "cached": True}
+
+    async def run(i: int):
+        parts, degraded = [], False
+        try:
+            async for delta in answer_stream(i):
+                degraded = degraded or isinstance(delta, DegradedAnswer)
+                parts.append(str(delta))
+                await queue.put({"type": "delta", "index": i, "delta": str(delta)})
+        except Exception as e:
+            logging.error(f"Streaming answer {i + 1} failed: {e}")
+            degraded = True
+            if not parts:
+                parts.append(f"Error processing question: {e}")
+        answer = "".join(parts).strip()
+        if degraded:
+            answer = DegradedAnswer(answer)
+        answers[i] = answer
+        if on_answer is not None:
+            await on_answer(i, answer)
+        await queue.put({"type": "answer", "index": i, "answer": str(answer), "degraded": degraded, "cached": False})
+
+    missing = [i for i, answer in enumerate(answers) if answer is None]
+    tasks = [asyncio.create_task(run(i)) for i in missing]
+    finished = asyncio.gather(*tasks)
+    finished.add_done_callback(lambda _: queue.put_nowait(_DONE))
+    try:
+        while tasks:
+            event = await queue.get()
+            if event is _DONE:  # queued after every task's last event
+                break
+            yield event
+        yield {"type": "done", "answers": [str(answer) for answer in answers]}
+    finally:
+        # Client went away mid-stream - stop generating answers nobody will read
+        for task in tasks:
+            task.cancel()
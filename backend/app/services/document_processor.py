@@ -1,47 +1,110 @@
 import PyPDF2
 from io import BytesIO
-import zipfile
-import xml.etree.ElementTree as ET
+import asyncio
 import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from app.core.config import settings
+from app.utils.docx_parser import parse_docx_text
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
 
 async def parse_document_from_bytes(content: bytes, filename: str) -> str:
     """Parse document from bytes content"""
     try:
+        loop = asyncio.get_running_loop()
         if filename.lower().endswith('.pdf'):
-            return parse_pdf_from_bytes(content)
+            return await loop.run_in_executor(None, parse_pdf_from_bytes, content)
         elif filename.lower().endswith('.docx'):
-            return parse_docx_from_bytes(content)
+            return await loop.run_in_executor(None, parse_docx_from_bytes, content)
         else:
             raise ValueError(f"Unsupported file type: {filename}")
     except Exception as e:
         logging.error(f"Error parsing document {filename}: {e}")
         raise
 
+async def parse_document_pages_from_bytes(content: bytes, filename: str) -> List[Tuple[int, str]]:
+    """Parse document into (page_number, text) pairs; DOCX has no pages so it is page 1"""
+    try:
+        loop = asyncio.get_running_loop()
+        if filename.lower().endswith('.pdf'):
+            return await loop.run_in_executor(None, parse_pdf_pages_from_bytes, content)
+        elif filename.lower().endswith('.docx'):
+            return [(1, await loop.run_in_executor(None, parse_docx_from_bytes, content))]
+        else:
+            raise ValueError(f"Unsupported file type: {filename}")
+    except Exception as e:
+        logging.error(f"Error parsing document {filename}: {e}")
+        raise
+
+def start_pdf_pool():
+    """Create the PDF extraction pool - called at startup, before traffic"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None and settings.PDF_EXTRACT_WORKERS > 1:
+            # spawn, not fork: forking a threaded process with torch loaded can deadlock
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _pdf_pool
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    return _pdf_pool or start_pdf_pool()
+
+def _extract_page_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages [start, end) of the PDF at path in a worker process; page numbers are 1-based"""
+    reader = PyPDF2.PdfReader(path)
+    return [(n + 1, reader.pages[n].extract_text() or "") for n in range(start, end)]
+
+def parse_pdf_pages_from_bytes(content: bytes) -> List[Tuple[int, str]]:
+    """Extract per-page text, spreading page ranges over a process pool for large PDFs"""
+    reader = PyPDF2.PdfReader(BytesIO(content))
+    page_count = len(reader.pages)
+    workers = settings.PDF_EXTRACT_WORKERS
+    if workers <= 1 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+        return [(n + 1, page.extract_text() or "") for n, page in enumerate(reader.pages)]
+
+    # A couple of ranges per worker evens out pages that are slow to extract
+    range_count = min(page_count, workers * 2)
+    step = -(-page_count // range_count)
+    pool = _get_pdf_pool()
+    # Workers read the bytes from a temp file instead of each range pickling its own copy
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        futures = [
+            pool.submit(_extract_page_range, path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+    finally:
+        os.unlink(path)
+    logging.info(f"Extracted {page_count} PDF pages across {len(futures)} ranges")
+    return pages
+
 def parse_pdf_from_bytes(content: bytes) -> str:
     """Parse PDF from bytes"""
-    pdf_file = BytesIO(content)
-    reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    return "".join(f"{text}\n" for _, text in parse_pdf_pages_from_bytes(content))
 
 def parse_docx_from_bytes(content: bytes) -> str:
-    """Parse DOCX from bytes using manual XML parsing"""
+    """Parse DOCX from bytes with the streaming paragraph parser"""
     try:
-        docx_file = BytesIO(content)
-        with zipfile.ZipFile(docx_file, 'r') as zip_file:
-            # Read the main document XML
-            xml_content = zip_file.read('word/document.xml')
-            root = ET.fromstring(xml_content)
-            
-            # Extract text from XML
-            text = ""
-            for elem in root.iter():
-                if elem.text:
-                    text += elem.text + " "
-            
-            return text.strip()
+        return parse_docx_text(content)
     except Exception as e:
         logging.error(f"Error parsing DOCX: {e}")
         raise ValueError(f"Error parsing DOCX file: {e}")
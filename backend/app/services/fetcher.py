@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+class DocumentFetchError(Exception):
+    """Raised when a document URL cannot be downloaded"""
+
+
+class DocumentTooLargeError(DocumentFetchError):
+    """Raised when a document exceeds FETCH_MAX_BYTES"""
+
+
+class FetchedDocument:
+    """Downloaded document body held in a spooled temp buffer (RAM first, then disk)"""
+
+    def __init__(self, url: str, buffer, size: int, digest: str, content_type: str):
+        self.url = url
+        self.buffer = buffer
+        self.size = size
+        self.digest = digest  # SHA-256 of the body, computed while streaming
+        self.content_type = content_type
+
+    def guess_filename(self, default: str = "document.pdf") -> str:
+        """Filename with a parser-recognised extension, from the URL or content-type"""
+        filename = self.url.split('?')[0].split('/')[-1]
+        if filename.lower().endswith(('.pdf', '.docx')):
+            return filename
+        if 'pdf' in self.content_type:
+            return 'document.pdf'
+        if 'docx' in self.content_type or 'document' in self.content_type:
+            return 'document.docx'
+        return default
+
+    def read(self) -> bytes:
+        self.buffer.seek(0)
+        return self.buffer.read()
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive connection pool for all document downloads"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=settings.FETCH_CONNECT_TIMEOUT,
+                read=settings.FETCH_READ_TIMEOUT,
+                write=settings.FETCH_READ_TIMEOUT,
+                pool=settings.FETCH_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.FETCH_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_document(url: str, max_bytes: Optional[int] = None) -> FetchedDocument:
+    """
+    Stream a document into a spooled temp buffer without blocking the event loop.
+    The size limit is enforced while reading, so oversized bodies are never fully loaded.
+    """
+    max_bytes = max_bytes or settings.FETCH_MAX_BYTES
+    buffer = tempfile.SpooledTemporaryFile(max_size=settings.FETCH_SPOOL_MAX_MEMORY)
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        async with get_http_client().stream("GET", url) as response:
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise DocumentTooLargeError(f"Document is {declared} bytes, limit is {max_bytes}")
+            async for piece in response.aiter_bytes(64 * 1024):
+                size += len(piece)
+                if size > max_bytes:
+                    raise DocumentTooLargeError(f"Document exceeds the {max_bytes} byte limit")
+                sha.update(piece)
+                buffer.write(piece)
+            content_type = response.headers.get("content-type", "")
+    except httpx.HTTPError as e:
+        buffer.close()
+        raise DocumentFetchError(f"Error downloading {url}: {e}") from e
+    except Exception:
+        buffer.close()
+        raise
+    logging.info(f"Fetched {size} bytes from {url}")
+    return FetchedDocument(url, buffer, size, sha.hexdigest(), content_type)
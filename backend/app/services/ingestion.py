@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+from app.core.config import settings
+from app.core.document_registry import document_id_for_digest, get_document_registry
+from app.core.embeddings import delete_document_vectors, encode_chunks, store_embeddings, unstored_chunks
+from app.core.ingest_cache import IngestEntry, content_digest, ingest_cache
+from app.core.lexical_index import build_lexical_index
+from app.core.text_store import get_text_store
+from app.core.vector_store import get_vector_store
+from app.services.document_processor import parse_document_pages_from_bytes
+from app.services.fetcher import fetch_document
+from app.utils.chunking import chunk_pages, chunk_text, join_pages
+
+
+class IngestItem:
+    """One document moving through the download -> parse -> chunk -> embed -> upsert pipeline"""
+
+    def __init__(self, url: str = None, content: bytes = None,
+                 filename: str = None, default_filename: str = "document.pdf",
+                 keep_text: bool = False):
+        self.url = url
+        self.content = content
+        self.filename = filename
+        self.default_filename = default_filename
+        self.keep_text = keep_text      # caller needs the text in the text store even if already indexed
+        self.digest = None
+        self.previous_digest = None     # content the URL served before this revision
+        self.document_id = None
+        self.index_id = None            # ID the vectors are stored under (see DocumentRegistry.assign_index_id)
+        self.text = None
+        self.page_starts = None         # offset in text where each page begins
+        self.page_numbers = None
+        self.chunks = None
+        self.chunk_pages = None
+        self.embeddings = None
+        self.stage = "queued"
+        self.skipped = False            # already indexed by some worker, nothing to do
+        self.already_indexed = False    # indexed, but parsed anyway for keep_text
+        self.error: Optional[Exception] = None
+        self.timings = {}
+        self.progress = {}              # e.g. vectors upserted so far while in the upsert stage
+
+    @property
+    def source(self) -> str:
+        return self.url or self.filename or "upload"
+
+    @property
+    def active(self) -> bool:
+        return not self.skipped and self.error is None
+
+    def to_dict(self) -> dict:
+        if self.error is not None:
+            status = "failed"
+        elif self.skipped or (self.already_indexed and self.stage == "done"):
+            status = "already_indexed"
+        else:
+            status = "indexed" if self.stage == "done" else self.stage
+        return {
+            "source": self.source,
+            "status": status,
+            "document_id": self.document_id,
+            "chunks": len(self.chunks) if self.chunks is not None else None,
+            "error": str(self.error) if self.error is not None else None,
+            "timings": self.timings,
+            "progress": self.progress,
+        }
+
+
+def _is_indexed(digest: str) -> bool:
+    """
+    Indexed in the configured vector index. The registry outlives an in-memory store,
+    so that one is asked directly whether it holds the document.
+    """
+    index_id = get_document_registry().index_id(digest)
+    if index_id is None:
+        return False
+    store = get_vector_store()
+    return store.persistent or bool(store.list_ids(f"doc-{index_id}-"))
+
+
+def _needs_text(item: IngestItem, digest: str) -> bool:
+    return item.keep_text and not get_text_store().has(digest)
+
+
+async def _download(item: IngestItem):
+    registry = get_document_registry()
+    if item.url is not None:
+        known = registry.lookup_url(item.url)
+        fresh = (known and not _needs_text(item, known["digest"])
+                 and time.time() - known["fetched_at"] < settings.DOCUMENT_URL_TTL)
+        if fresh and known["indexed"] and _is_indexed(known["digest"]):
+            logging.info(f"{item.url} already indexed as document {known['document_id']}")
+            item.digest = known["digest"]
+            item.document_id = known["document_id"]
+            item.skipped = True
+            return
+        logging.info(f"Downloading document from: {item.url}")
+        with await fetch_document(item.url) as document:
+            item.digest = document.digest
+            if known and known["digest"] != document.digest:
+                item.previous_digest = known["digest"]
+            item.filename = item.filename or document.guess_filename(item.default_filename)
+            registry.record_url(item.url, document.digest)
+            if _needs_text(item, document.digest) or not _is_indexed(document.digest):
+                item.content = document.read()
+    else:
+        item.digest = content_digest(item.content)
+        item.filename = item.filename or item.default_filename
+        registry.record_upload(item.digest)
+
+    item.document_id = document_id_for_digest(item.digest)
+    if _is_indexed(item.digest):
+        item.index_id = registry.index_id(item.digest)
+        logging.info(f"Document {item.document_id} already indexed, skipping ingestion")
+        if _needs_text(item, item.digest):
+            item.already_indexed = True
+        else:
+            item.content = None
+            item.skipped = True
+        await _retire_previous(item)
+
+
+async def _retire_previous(item: IngestItem):
+    """
+    Document IDs follow the content, so a revised URL gets a new ID. Unless another URL
+    or an upload still stands for the revision it replaced, that revision is retired:
+    its vectors were either taken over by this one (and the vanished chunks already
+    deleted while syncing) or, if this content was indexed on its own, are dropped.
+    """
+    registry = get_document_registry()
+    if item.previous_digest is None or registry.references(item.previous_digest):
+        return
+    previous_id = registry.index_id(item.previous_digest)
+    if previous_id is None:
+        return
+    if previous_id != item.index_id:
+        deleted = await asyncio.get_running_loop().run_in_executor(None, delete_document_vectors, previous_id)
+        removed = "the" if deleted is None else f"{deleted}"
+        logging.info(f"{item.source} was revised: removed {removed} vectors of the previous revision")
+    registry.mark_unindexed(item.previous_digest)
+
+
+async def _parse(item: IngestItem):
+    entry = ingest_cache.get(item.digest)
+    if entry is not None:
+        # Parsed (and maybe embedded) earlier in this process
+        item.text, item.chunks, item.embeddings = entry.text, entry.chunks, entry.embeddings
+        item.chunk_pages = entry.chunk_pages
+    else:
+        pages = await parse_document_pages_from_bytes(item.content, item.filename)
+        item.text, item.page_starts, item.page_numbers = join_pages(pages)
+    item.content = None
+    # Shared by all workers: /run reads uploads from here, whichever worker parsed them
+    await asyncio.get_running_loop().run_in_executor(None, get_text_store().put, item.digest, item.text)
+
+
+async def _chunk(item: IngestItem):
+    if item.chunks is None and not item.already_indexed:
+        if item.page_starts is not None:
+            item.chunks, item.chunk_pages = await asyncio.get_running_loop().run_in_executor(
+                None, chunk_pages, item.text, item.page_starts, item.page_numbers
+            )
+        else:
+            item.chunks = await asyncio.get_running_loop().run_in_executor(None, chunk_text, item.text)
+        logging.info(f"Created {len(item.chunks)} chunks for {item.source}")
+    if item.chunks is not None and not item.already_indexed:
+        await asyncio.get_running_loop().run_in_executor(
+            None, build_lexical_index, item.document_id, item.chunks, item.text, item.digest
+        )
+
+
+async def _embed(item: IngestItem):
+    if item.already_indexed:
+        item.text = None
+        return
+    item.index_id = get_document_registry().assign_index_id(item.digest, item.previous_digest)
+    if item.embeddings is None:
+        # Only chunks without a vector in the index yet - a revision reuses the rest
+        loop = asyncio.get_running_loop()
+        pending = await loop.run_in_executor(None, unstored_chunks, item.chunks, item.index_id)
+        logging.info(f"Encoding {len(pending)} of {len(item.chunks)} chunks for {item.source}")
+        item.embeddings = dict(zip(pending, await loop.run_in_executor(None, encode_chunks, pending)))
+        ingest_cache.put(item.digest, IngestEntry(
+            text=item.text, chunks=item.chunks, chunk_pages=item.chunk_pages, embeddings=item.embeddings
+        ))
+    item.text = None
+
+
+async def _upsert(item: IngestItem):
+    if item.already_indexed:
+        return
+    def on_progress(upserted, total):
+        item.progress = {"vectors_upserted": upserted, "vectors_total": total}
+
+    await asyncio.get_running_loop().run_in_executor(
+        None, lambda: store_embeddings(item.chunks, document_id=item.index_id, embeddings=item.embeddings,
+                                       on_progress=on_progress, pages=item.chunk_pages)
+    )
+    item.embeddings = None
+    get_document_registry().mark_indexed(item.digest, len(item.chunks), item.index_id)
+    logging.info(f"Stored embeddings for document_id: {item.document_id}")
+    await _retire_previous(item)
+
+
+def _stages():
+    return [
+        ("download", _download, settings.PIPELINE_DOWNLOAD_CONCURRENCY),
+        ("parse", _parse, settings.PIPELINE_PARSE_WORKERS),
+        ("chunk", _chunk, settings.PIPELINE_CHUNK_WORKERS),
+        ("embed", _embed, settings.PIPELINE_EMBED_WORKERS),
+        ("upsert", _upsert, settings.PIPELINE_UPSERT_WORKERS),
+    ]
+
+
+async def run_pipeline(items: List[IngestItem],
+                       on_progress: Callable[[IngestItem], None] = None) -> List[IngestItem]:
+    """
+    Push documents through the ingestion stages concurrently. Each stage has its own
+    workers and a bounded queue in front of it, so downloads, parsing and encoding of
+    different documents overlap while memory stays bounded. Failures are recorded on
+    the item and never stop the rest of the batch.
+    """
+    stages = _stages()
+    queues = [asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE) for _ in stages]
+
+    async def feed():
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0][2]):
+            await queues[0].put(None)
+
+    async def worker(index: int):
+        name, step, _ = stages[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        while True:
+            item = await queues[index].get()
+            if item is None:
+                return
+            if item.active:
+                item.stage = name
+                started = time.perf_counter()
+                try:
+                    await step(item)
+                except Exception as e:
+                    logging.error(f"Ingestion of {item.source} failed at {name}: {e}")
+                    item.error = e
+                item.timings[name] = round(time.perf_counter() - started, 3)
+                if outbox is None and item.active:
+                    item.stage = "done"
+                if on_progress:
+                    on_progress(item)
+            if outbox is not None:
+                await outbox.put(item)
+
+    async def run_stage(index: int):
+        await asyncio.gather(*(worker(index) for _ in range(stages[index][2])))
+        if index + 1 < len(stages):
+            for _ in range(stages[index + 1][2]):
+                await queues[index + 1].put(None)
+
+    await asyncio.gather(feed(), *(run_stage(i) for i in range(len(stages))))
+    return items
+
+
+async def ingest_item(item: IngestItem) -> int:
+    """Run a single document through the pipeline, raising its error if it failed"""
+    await run_pipeline([item])
+    if item.error is not None:
+        raise item.error
+    return item.document_id
+
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.services.ingestion import IngestItem, run_pipeline
+
+STAGES = ["download", "parse", "chunk", "embed", "upsert"]
+
+
+class IngestJob:
+    """Background ingestion of one document (or a bulk batch), with per-stage progress for polling"""
+
+    def __init__(self, items: List[IngestItem], on_complete: Callable[["IngestJob"], None] = None):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.on_complete = on_complete
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    @property
+    def item(self) -> IngestItem:
+        return self.items[0]
+
+    @property
+    def status(self) -> str:
+        if not self.done.is_set():
+            return "running" if self.started_at else "queued"
+        failed = self.items and all(item.error is not None for item in self.items)
+        return "failed" if failed else "completed"
+
+    def stage_progress(self) -> Dict[str, str]:
+        progress = {}
+        for stage in STAGES:
+            if stage in self.item.timings:
+                progress[stage] = "done"
+            elif self.item.skipped and self.done.is_set():
+                progress[stage] = "skipped"
+            elif stage == self.item.stage and self.started_at and not self.done.is_set():
+                progress[stage] = "running"
+            else:
+                progress[stage] = "pending"
+        return progress
+
+    def to_dict(self) -> dict:
+        if len(self.items) != 1:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "documents": [item.to_dict() for item in self.items],
+                "queued_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+                "total_seconds": round(self.finished_at - self.created_at, 3) if self.finished_at else None,
+            }
+        result = self.item.to_dict()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "document_id": self.item.document_id,
+            "source": result["source"],
+            "chunks": result["chunks"],
+            "error": result["error"],
+            "stages": self.stage_progress(),
+            "progress": self.item.progress,
+            "timings": self.item.timings,
+            "queued_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "total_seconds": round(self.finished_at - self.created_at, 3) if self.finished_at else None,
+        }
+
+
+class JobStore:
+    """
+    Job status snapshots in SQLite, so every worker can answer status polls and wait
+    on documents whose ingestion job runs in another worker.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_documents ("
+                " document_id INTEGER NOT NULL, job_id TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (document_id, job_id))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, job: IngestJob):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, snapshot, updated_at) VALUES (?, ?, ?, ?)",
+                (job.id, job.status, json.dumps(job.to_dict()), time.time()),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_documents (document_id, job_id, created_at) VALUES (?, ?, ?)",
+                [(item.document_id, job.id, job.created_at) for item in job.items if item.document_id is not None],
+            )
+
+    def load(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT snapshot FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest_for_document(self, document_id: int) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT j.snapshot FROM job_documents d JOIN jobs j ON j.id = d.job_id"
+                " WHERE d.document_id = ? ORDER BY d.created_at DESC LIMIT 1",
+                (document_id,),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune(self, cutoff: float):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE updated_at < ? AND status IN ('completed', 'failed')", (cutoff,))
+            conn.execute("DELETE FROM job_documents WHERE job_id NOT IN (SELECT id FROM jobs)")
+
+
+class JobManager:
+    """
+    Queue of ingestion jobs drained by a fixed pool of background workers. Status
+    snapshots go to a JobStore, so polls and waits work from any worker process.
+    """
+
+    def __init__(self, worker_count: int, retention_seconds: int, store_path: str):
+        self.worker_count = worker_count
+        self.retention_seconds = retention_seconds
+        self.store_path = store_path
+        self._store: Optional[JobStore] = None
+        self._jobs: Dict[str, IngestJob] = {}
+        self._by_document: Dict[int, IngestJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.store_path)
+        return self._store
+
+    def _save(self, job: IngestJob):
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not persist status of ingestion job {job.id}: {e}")
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                await run_pipeline(job.items, on_progress=lambda item: self._save(job))
+                if job.on_complete:
+                    job.on_complete(job)
+            except Exception as e:
+                logging.error(f"Ingestion job {job.id} crashed: {e}")
+                for item in job.items:
+                    item.error = item.error or e
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+                self._save(job)
+                logging.info(f"Ingestion job {job.id} {job.status} in {job.finished_at - job.created_at:.2f}s")
+
+    def submit(self, item: IngestItem, on_complete: Callable[[IngestJob], None] = None) -> IngestJob:
+        return self.submit_many([item], on_complete)
+
+    def submit_many(self, items: List[IngestItem], on_complete: Callable[[IngestJob], None] = None) -> IngestJob:
+        """One job for a batch of documents, run through the pipeline together"""
+        self._ensure_workers()
+        self._prune()
+        job = IngestJob(items, on_complete)
+        self._jobs[job.id] = job
+        for item in items:
+            if item.document_id is not None:
+                self._by_document[item.document_id] = job
+        self._save(job)
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """A job running in this process"""
+        return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Status of a job from any worker: live for our own jobs, the last snapshot otherwise"""
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else self.store.load(job_id)
+
+    async def wait_for_document(self, document_id: int, timeout: float = None) -> Optional[dict]:
+        """Block until a pending ingestion of document_id, in any worker, finishes (or the timeout passes)"""
+        timeout = settings.INGEST_WAIT_TIMEOUT if timeout is None else timeout
+        job = self._by_document.get(document_id)
+        if job is not None:
+            if not job.done.is_set():
+                logging.info(f"Waiting up to {timeout}s for ingestion job {job.id} (document {document_id})")
+                try:
+                    await asyncio.wait_for(job.done.wait(), timeout)
+                except asyncio.TimeoutError:
+                    logging.warning(f"Document {document_id} still ingesting after {timeout}s")
+            return job.to_dict()
+
+        # Submitted to another worker - poll its snapshots
+        deadline = time.monotonic() + timeout
+        snapshot = self.store.latest_for_document(document_id)
+        while snapshot is not None and snapshot["status"] in ("queued", "running"):
+            if time.monotonic() >= deadline:
+                logging.warning(f"Document {document_id} still ingesting after {timeout}s")
+                break
+            await asyncio.sleep(settings.INGEST_WAIT_POLL_SECONDS)
+            snapshot = self.store.latest_for_document(document_id)
+        return snapshot
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            job = self._jobs.pop(job_id)
+            for item in job.items:
+                if self._by_document.get(item.document_id) is job:
+                    del self._by_document[item.document_id]
+        try:
+            self.store.prune(cutoff)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not prune ingestion job snapshots: {e}")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+
+job_manager = JobManager(
+    settings.INGEST_JOB_WORKERS, settings.INGEST_JOB_RETENTION, os.path.join(settings.DATA_DIR, "jobs.sqlite3")
+)
@@ -1,21 +1,16 @@
-from app.core.config import settings
-import requests
-import json
-import time
+from app.services.llm_client import DegradedAnswer, LLMError, get_provider
+import asyncio
+import logging
 
-def ask_llm(question, context_chunks):
-    # Use Google Gemini Pro API for text generation
-    api_key = settings.GEMINI_API_KEY
+async def ask_llm(question, context_chunks):
+    # Use Google Gemini API for text generation
+    provider = get_provider("gemini")
     context = "\n".join(context_chunks)
-    # Use the new Gemini 1.5 Flash endpoint
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
-    # Build Gemini-style payload with enhanced prompt for better formatting
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": f"""Based on the following context from the policy document, provide a clear and comprehensive answer to the question. 
+    if provider is None:
+        logging.error("GEMINI_API_KEY is not set")
+        return DegradedAnswer(generate_fallback_response(question, context))
+    # Build Gemini-style prompt with enhanced instructions for better formatting
+    prompt = f"""Based on the following context from the policy document, provide a clear and comprehensive answer to the question. 
 
 Context: {context}
 
@@ -26,14 +21,7 @@ Please provide your answer in a well-structured format with:
 2. Supporting details from the context if available
 3. Any relevant additional information
 
-Answer:"""}
-                ]
-            }
-        ]
-    }
-    import logging
-    logging.info(f"Gemini request URL: {url}")
-    logging.info(f"Gemini request payload: {json.dumps(payload)}")
+Answer:"""
     
     # Try with retry logic for service unavailable errors
     max_retries = 3
@@ -41,44 +29,20 @@ Answer:"""}
     
     for attempt in range(max_retries):
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            logging.info(f"Gemini response: {response.status_code} {response.text}")
-            
-            if response.status_code == 503:
-                if attempt < max_retries - 1:
-                    logging.warning(f"Gemini service unavailable, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    # Fallback response for service unavailable
-                    return generate_fallback_response(question, context)
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            # Check if we have a valid response
-            if 'candidates' in result and len(result['candidates']) > 0:
-                return result["candidates"][0]["content"]["parts"][0]["text"].strip()
-            else:
-                logging.error(f"Invalid Gemini response structure: {result}")
-                return generate_fallback_response(question, context)
-                
-        except requests.exceptions.Timeout as e:
-            logging.error(f"Gemini API timeout: {e}")
+            # Use the Gemini 1.5 Flash endpoint
+            return await provider.complete(prompt, model="gemini-1.5-flash")
+        except LLMError as e:
+            logging.error(f"Gemini error: {e}")
             if attempt < max_retries - 1:
                 logging.warning(f"Retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries})")
-                time.sleep(retry_delay)
-                continue
-            return generate_fallback_response(question, context)
-        except Exception as e:
-            logging.error(f"Gemini error: {e}, response: {getattr(e, 'response', None)}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
+                # Sleeping here doesn't hold the provider's concurrency slot
+                await asyncio.sleep(retry_delay)
+                if e.status_code == 503:
+                    retry_delay *= 2  # Exponential backoff
                 continue
-            return generate_fallback_response(question, context)
+            return DegradedAnswer(generate_fallback_response(question, context))
     
-    return generate_fallback_response(question, context)
+    return DegradedAnswer(generate_fallback_response(question, context))
 
 def generate_fallback_response(question, context):
     """Generate a basic response when Gemini is unavailable"""
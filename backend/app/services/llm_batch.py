@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+from app.core.config import settings
+from app.services.llm_client import LLMError, LLMProvider
+from app.services.llm_router import get_router
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Provider-agnostic estimate (~4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def plan_batches(questions: Sequence[str], contexts: Sequence[Sequence[str]]) -> List[List[int]]:
+    """
+    Group question indices so each batch's shared context (the union of its
+    questions' passages), questions and reserved answer tokens fit the prompt budget.
+    """
+    batches, batch, passages = [], [], {}
+    for i, question in enumerate(questions):
+        added = {p: None for p in contexts[i] if p not in passages}
+        tokens = (sum(estimate_tokens(p) for p in passages) + sum(estimate_tokens(p) for p in added)
+                  + sum(estimate_tokens(questions[j]) + settings.LLM_BATCH_ANSWER_TOKENS for j in batch + [i]))
+        if batch and (len(batch) >= settings.LLM_BATCH_MAX_QUESTIONS or tokens > settings.LLM_BATCH_MAX_PROMPT_TOKENS):
+            batches.append(batch)
+            batch, passages = [], {}
+            added = dict.fromkeys(contexts[i])
+        batch.append(i)
+        passages.update(added)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_prompt(questions: Sequence[str], contexts: Sequence[Sequence[str]], batch: List[int]) -> str:
+    passages = list(dict.fromkeys(p for i in batch for p in contexts[i] if p.strip()))
+    context = "\n\n".join(f"[{n + 1}] {p.strip()}" for n, p in enumerate(passages))
+    numbered = "\n".join(f"{i + 1}. {questions[i]}" for i in batch)
+    return f"""Based on the following context from the policy document, answer each question clearly and accurately. If the context does not contain the answer, say so.
+
+Context:
+{context}
+
+Questions:
+{numbered}
+
+Respond with JSON only, in exactly this form, with one entry per question number above:
+{{"answers": [{{"index": <question number>, "answer": "<answer text>"}}]}}"""
+
+
+def parse_batch_answers(text: str, batch: List[int]) -> Dict[int, str]:
+    """Valid answers keyed by (0-based) question index; anything malformed is left out"""
+    try:
+        data = json.loads(_FENCE_RE.sub("", text.strip()))
+    except ValueError:
+        logging.warning(f"Batched LLM reply is not JSON: {text[:200]}")
+        return {}
+    items = data.get("answers") if isinstance(data, dict) else data
+    answers = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index, answer = item.get("index"), item.get("answer")
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        if isinstance(index, int) and index - 1 in batch and isinstance(answer, str) and answer.strip():
+            answers[index - 1] = answer.strip()
+    return answers
+
+
+async def answer_questions_batched(questions: Sequence[str], contexts: Sequence[Sequence[str]],
+                                   answer_one: Callable[[int], Awaitable[str]]) -> List[str]:
+    """
+    Answer questions with one structured JSON call per batch of questions that share
+    a context, instead of one call per question. Batches run concurrently; any
+    question the batch reply misses (or gets wrong) goes through answer_one(index).
+    """
+    router = get_router()
+    answers: List[str] = [None] * len(questions)
+
+    async def run_batch(batch: List[int]):
+        found = {}
+        if len(batch) > 1 and router.providers:
+            prompt = build_batch_prompt(questions, contexts, batch)
+
+            async def call(provider: LLMProvider) -> str:
+                return await provider.complete(
+                    prompt, options=provider.json_options(settings.LLM_BATCH_ANSWER_TOKENS * len(batch))
+                )
+
+            try:
+                found = parse_batch_answers(await router.complete(call), batch)
+            except LLMError as e:
+                logging.error(f"Batched LLM call for {len(batch)} questions failed: {e}")
+            logging.info(f"Batched {len(batch)} questions into one call, "
+                         f"{len(found)} answered, {estimate_tokens(prompt)} prompt tokens")
+        missing = [i for i in batch if i not in found]
+        fallback = await asyncio.gather(*(answer_one(i) for i in missing))
+        found.update(zip(missing, fallback))
+        for i in batch:
+            answers[i] = found[i]
+
+    await asyncio.gather(*(run_batch(batch) for batch in plan_batches(questions, contexts)))
+    return answers
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+class LLMError(Exception):
+    """A provider call failed; status_code is set for HTTP errors"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class DegradedAnswer(str):
+    """Answer text produced without a successful LLM call (fallback or error message); never cached"""
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_llm_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive connection pool for all LLM provider calls"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _client
+
+
+async def close_llm_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class LLMProvider:
+    """One LLM API, with at most `concurrency` requests in flight from this process"""
+
+    def __init__(self, name: str, api_key: str, model: str, concurrency: int):
+        self.name = name
+        self.api_key = api_key
+        self.model = model
+        self.concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _request(self, prompt: str, system: Optional[str], model: Optional[str], options: Optional[dict]):
+        """(url, params, headers, json body) for one completion"""
+        raise NotImplementedError
+
+    def _parse(self, result: dict) -> str:
+        raise NotImplementedError
+
+    def _stream_request(self, prompt: str, system: Optional[str], model: Optional[str], options: Optional[dict]):
+        """Like _request, for a server-sent-events stream of the completion"""
+        raise NotImplementedError
+
+    def _parse_delta(self, event: dict) -> str:
+        """Text added by one stream event (may be empty)"""
+        raise NotImplementedError
+
+    def json_options(self, max_tokens: int) -> dict:
+        """Generation options asking for a JSON-only reply"""
+        raise NotImplementedError
+
+    async def complete(self, prompt: str, system: str = None, model: str = None, options: dict = None) -> str:
+        url, params, headers, payload = self._request(prompt, system, model, options)
+        started = time.perf_counter()
+        async with self.semaphore:
+            try:
+                response = await get_llm_http_client().post(url, params=params, headers=headers, json=payload)
+            except httpx.TimeoutException as e:
+                raise LLMError(f"{self.name} timed out: {e}") from e
+            except httpx.HTTPError as e:
+                raise LLMError(f"{self.name} request failed: {e}") from e
+        if response.status_code >= 400:
+            raise LLMError(f"{self.name} returned {response.status_code}: {response.text[:200]}", response.status_code)
+        try:
+            text = self._parse(response.json())
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise LLMError(f"{self.name} returned an unexpected response format: {e}") from e
+        logging.info(f"{self.name} answered in {time.perf_counter() - started:.2f}s")
+        return text
+
+    async def stream(self, prompt: str, system: str = None, model: str = None,
+                     options: dict = None) -> AsyncIterator[str]:
+        """Yield the completion's text as the provider generates it"""
+        url, params, headers, payload = self._stream_request(prompt, system, model, options)
+        started = time.perf_counter()
+        async with self.semaphore:
+            try:
+                async with get_llm_http_client().stream(
+                    "POST", url, params=params, headers=headers, json=payload
+                ) as response:
+                    if response.status_code >= 400:
+                        body = (await response.aread()).decode("utf-8", "replace")
+                        raise LLMError(f"{self.name} returned {response.status_code}: {body[:200]}",
+                                       response.status_code)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            delta = self._parse_delta(json.loads(data))
+                        except (KeyError, IndexError, TypeError, ValueError) as e:
+                            raise LLMError(f"{self.name} sent an unexpected stream event: {e}") from e
+                        if delta:
+                            yield delta
+            except httpx.TimeoutException as e:
+                raise LLMError(f"{self.name} timed out: {e}") from e
+            except httpx.HTTPError as e:
+                raise LLMError(f"{self.name} request failed: {e}") from e
+        logging.info(f"{self.name} streamed an answer in {time.perf_counter() - started:.2f}s")
+
+
+class GeminiProvider(LLMProvider):
+    def _request(self, prompt, system, model, options):
+        text = f"{system}\n\n{prompt}" if system else prompt
+        payload = {"contents": [{"parts": [{"text": text}]}]}
+        if options:
+            payload["generationConfig"] = options
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model or self.model}:generateContent"
+        return url, {"key": self.api_key}, {"Content-Type": "application/json"}, payload
+
+    def json_options(self, max_tokens):
+        return {"responseMimeType": "application/json", "temperature": 0.2, "maxOutputTokens": max_tokens}
+
+    def _parse(self, result):
+        if not result.get("candidates"):
+            raise ValueError(f"no candidates in {str(result)[:200]}")
+        return result["candidates"][0]["content"]["parts"][0]["text"].strip()
+
+    def _stream_request(self, prompt, system, model, options):
+        url, params, headers, payload = self._request(prompt, system, model, options)
+        url = url.replace(":generateContent", ":streamGenerateContent")
+        return url, {**params, "alt": "sse"}, headers, payload
+
+    def _parse_delta(self, event):
+        candidates = event.get("candidates") or [{}]
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat-completions APIs (Groq, xAI Grok)"""
+
+    def __init__(self, name: str, api_key: str, model: str, concurrency: int, base_url: str):
+        super().__init__(name, api_key, model, concurrency)
+        self.base_url = base_url
+
+    def _request(self, prompt, system, model, options):
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        payload = {"messages": messages, "model": model or self.model, "stream": False}
+        payload.update(options or {})
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        return f"{self.base_url}/chat/completions", None, headers, payload
+
+    def json_options(self, max_tokens):
+        return {"response_format": {"type": "json_object"}, "temperature": 0.2, "max_tokens": max_tokens}
+
+    def _parse(self, result):
+        return result["choices"][0]["message"]["content"].strip()
+
+    def _stream_request(self, prompt, system, model, options):
+        url, params, headers, payload = self._request(prompt, system, model, options)
+        payload["stream"] = True
+        return url, params, headers, payload
+
+    def _parse_delta(self, event):
+        choices = event.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or ""
+
+
+_providers: Optional[Dict[str, LLMProvider]] = None
+
+
+def get_providers() -> Dict[str, LLMProvider]:
+    """Providers with an API key configured, in preference order"""
+    global _providers
+    if _providers is None:
+        providers = {}
+        if settings.GEMINI_API_KEY:
+            providers["gemini"] = GeminiProvider(
+                "gemini", settings.GEMINI_API_KEY, "gemini-1.5-flash-latest", settings.LLM_CONCURRENCY_GEMINI
+            )
+        if settings.GROQ_API_KEY:
+            providers["groq"] = OpenAICompatibleProvider(
+                "groq", settings.GROQ_API_KEY, "llama3-8b-8192", settings.LLM_CONCURRENCY_GROQ,
+                "https://api.groq.com/openai/v1",
+            )
+        if settings.GROK_API_KEY:
+            providers["grok"] = OpenAICompatibleProvider(
+                "grok", settings.GROK_API_KEY, "grok-beta", settings.LLM_CONCURRENCY_GROK, "https://api.x.ai/v1",
+            )
+        _providers = providers
+    return _providers
+
+
+def get_provider(name: str) -> Optional[LLMProvider]:
+    return get_providers().get(name)
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.config import settings
+from app.services.llm_client import LLMError, LLMProvider, get_providers
+
+T = TypeVar("T")
+
+
+class ProviderHealth:
+    """
+    Rolling latency and outcome stats for one provider, plus its circuit breaker:
+    closed (in use) -> open (skipped for the cooldown) -> half-open (one trial
+    request; success closes it, failure opens it again).
+    """
+
+    def __init__(self, window: int):
+        self.latencies: deque = deque(maxlen=window)  # seconds, successful (or hedged-away) calls
+        self.outcomes: deque = deque(maxlen=window)   # True for success
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half-open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self.trial_in_flight)
+
+    def allow(self) -> bool:
+        """available(), and claims the single trial slot of a half-open breaker"""
+        if not self.available():
+            return False
+        if self.state == "half-open":
+            self.trial_in_flight = True
+        return True
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < settings.LLM_ROUTER_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def hedge_delay(self) -> float:
+        """How long to wait on this provider before asking another one"""
+        latency = self.quantile(settings.LLM_HEDGE_QUANTILE)
+        if latency is None:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(latency, settings.LLM_HEDGE_MIN_DELAY)
+
+    def expected_latency(self) -> float:
+        """Ranking score: median latency inflated by the error rate; unmeasured providers rank last"""
+        median = self.quantile(0.5)
+        if median is None:
+            return float("inf")
+        return median / max(1.0 - self.error_rate(), 0.05)
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.state == "half-open":
+            # Recovered - judge it on fresh outcomes from here on
+            self.outcomes.clear()
+            self.outcomes.append(True)
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Returns True if this failure opened the breaker"""
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        state = self.state
+        if state == "open":
+            return False  # a call from before the breaker opened
+        if (state == "half-open"
+                or self.consecutive_failures >= settings.LLM_BREAKER_FAILURES
+                or (len(self.outcomes) >= settings.LLM_ROUTER_MIN_SAMPLES
+                    and self.error_rate() >= settings.LLM_BREAKER_ERROR_RATE)):
+            self.open_until = time.monotonic() + settings.LLM_BREAKER_COOLDOWN
+            return True
+        return False
+
+    def record_abandoned(self, elapsed: float):
+        """A call cancelled because a hedge won: at least this slow, but not a failure"""
+        self.latencies.append(elapsed)
+        self.trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate(), 4),
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+        }
+
+
+class LLMRouter:
+    """
+    Sends each call to the healthiest, fastest provider. If it hasn't answered by
+    its own p95 latency, the same call goes to the next provider as well (hedging)
+    and the first reply wins; failures fail over immediately. Providers whose
+    breaker is open are skipped, so a bad provider costs nothing until its trial.
+    """
+
+    def __init__(self, providers: Dict[str, LLMProvider]):
+        self.providers = providers
+        self.health = {name: ProviderHealth(settings.LLM_ROUTER_WINDOW) for name in providers}
+
+    def ranked(self) -> List[LLMProvider]:
+        """Available providers, fastest expected first (configuration order breaks ties)"""
+        candidates = [p for p in self.providers.values() if self.health[p.name].available()]
+        return sorted(candidates, key=lambda p: self.health[p.name].expected_latency())
+
+    def record(self, provider: LLMProvider, latency: Optional[float]):
+        """Outcome of a call made outside complete() (streaming); latency None for a failure"""
+        health = self.health[provider.name]
+        if latency is None:
+            if health.record_failure():
+                logging.warning(f"Circuit breaker open for {provider.name} ({settings.LLM_BREAKER_COOLDOWN:.0f}s)")
+        else:
+            health.record_success(latency)
+
+    async def _attempt(self, provider: LLMProvider, call: Callable[[LLMProvider], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        try:
+            result = await call(provider)
+        except asyncio.CancelledError:
+            self.health[provider.name].record_abandoned(time.monotonic() - started)
+            raise
+        except LLMError:
+            self.record(provider, None)
+            raise
+        self.record(provider, time.monotonic() - started)
+        return result
+
+    async def complete(self, call: Callable[[LLMProvider], Awaitable[T]]) -> T:
+        """Run call(provider) against the routed provider(s); raises LLMError if none succeeds"""
+        queue = self.ranked()
+        if not queue:
+            raise LLMError("No LLM provider available (none configured or all cooling down)")
+
+        running: Dict[asyncio.Task, LLMProvider] = {}
+        last_error: Optional[Exception] = None
+
+        def launch() -> Optional[LLMProvider]:
+            while queue:
+                provider = queue.pop(0)
+                if self.health[provider.name].allow():
+                    running[asyncio.create_task(self._attempt(provider, call))] = provider
+                    return provider
+            return None
+
+        newest = launch()
+        try:
+            while running:
+                hedge = settings.LLM_HEDGE_ENABLED and queue and newest is not None
+                timeout = self.health[newest.name].hedge_delay() if hedge else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = launch()
+                    if hedged is not None:
+                        logging.info(f"{newest.name} slower than {timeout:.1f}s, hedging with {hedged.name}")
+                    newest = hedged
+                    continue
+                winner = None
+                for task in done:
+                    provider = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        winner = task
+                    elif isinstance(error, LLMError):
+                        logging.error(f"{provider.name} failed: {error}")
+                        last_error = error
+                    else:
+                        raise error
+                if winner is not None:
+                    return winner.result()
+                if not running:
+                    # Everything in flight failed - fail over to the next provider
+                    newest = launch()
+        finally:
+            for task in running:
+                task.cancel()
+        raise last_error or LLMError("No LLM provider available (all cooling down)")
+
+    def stats(self) -> dict:
+        return {name: health.stats() for name, health in self.health.items()}
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_router() -> LLMRouter:
+    global _router
+    if _router is None:
+        _router = LLMRouter(get_providers())
+    return _router
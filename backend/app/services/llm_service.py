@@ -1,39 +1,37 @@
-import os
-import requests
-import json
+import asyncio
+import logging
+import time
+from typing import AsyncIterator
 
-def query_llm(question: str, context: str = "") -> str:
-    """Query LLM with document context - Gemini preferred"""
-    
-    # Try Gemini first (user's preference)
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if gemini_api_key:
-        return query_gemini(question, context, gemini_api_key)
+from app.core.lexical_index import best_sentences, split_sentences
+from app.services.llm_client import DegradedAnswer, LLMError, LLMProvider
+from app.services.llm_router import get_router
+
+async def query_llm(question: str, context: str = "") -> str:
+    """
+    Query LLM with document context - routed to the fastest healthy provider, hedged
+    when slow. Raises LLMError if every provider fails; callers pick the fallback.
+    """
+    router = get_router()
     
-    # Try Groq as fallback (free tier available)
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    if groq_api_key:
-        return query_groq(question, context, groq_api_key)
+    # If no API keys, return intelligent fallback
+    if not router.providers:
+        return DegradedAnswer(generate_fallback_response(question, context))
     
-    # Try Grok as final fallback
-    grok_api_key = os.getenv("GROK_API_KEY")
-    if grok_api_key:
-        return query_grok(question, context, grok_api_key)
+    async def call(provider: LLMProvider) -> str:
+        prompt, system, options = PROVIDER_REQUESTS[provider.name](question, context)
+        return await provider.complete(prompt, system=system, options=options)
     
-    # If no API keys, return intelligent fallback
-    return generate_fallback_response(question, context)
+    return await router.complete(call)
 
-def query_gemini(question: str, context: str, api_key: str) -> str:
-    """Query Google Gemini API"""
+def gemini_request(question: str, context: str):
+    """(prompt, system, options) for a Gemini answer"""
     
     # Truncate context to avoid token limits
     if len(context) > 2000:
         context = context[:2000] + "... [truncated]"
     
-    payload = {
-        "contents": [{
-            "parts": [{
-                "text": f"""You are a helpful document analysis assistant. Answer the question based on the provided document context.
+    prompt = f"""You are a helpful document analysis assistant. Answer the question based on the provided document context.
 
 Document Context:
 {context}
@@ -41,104 +39,70 @@ Document Context:
 Question: {question}
 
 Please provide a clear, concise answer based on the document content. If the information is not in the document, say so clearly."""
-            }]
-        }],
-        "generationConfig": {
-            "temperature": 0.3,
-            "topK": 40,
-            "topP": 0.95,
-            "maxOutputTokens": 500,
-        }
+    options = {
+        "temperature": 0.3,
+        "topK": 40,
+        "topP": 0.95,
+        "maxOutputTokens": 500,
     }
-    
-    try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={api_key}",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=30
-        )
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'candidates' in result and len(result['candidates']) > 0:
-            return result['candidates'][0]['content']['parts'][0]['text'].strip()
-        else:
-            return "Gemini API returned an unexpected response format."
-            
-    except Exception as e:
-        return f"Gemini API temporarily unavailable: {e}. Using document analysis fallback."
+    return prompt, None, options
 
-def query_groq(question: str, context: str, api_key: str) -> str:
-    """Query Groq API (free tier available)"""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+def groq_request(question: str, context: str):
+    """(prompt, system, options) for a Groq answer"""
     
     # Truncate context to avoid token limits
     if len(context) > 2000:
         context = context[:2000] + "... [truncated]"
     
-    payload = {
-        "messages": [
-            {
-                "role": "system", 
-                "content": "You are a helpful document analysis assistant. Answer questions based on the provided document context. Be concise but informative."
-            },
-            {
-                "role": "user", 
-                "content": f"Document Context:\n{context}\n\nQuestion: {question}\n\nPlease provide a clear answer based on the document content."
-            }
-        ],
-        "model": "llama3-8b-8192",  # Free tier model
-        "temperature": 0.3,
-        "max_tokens": 500
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        return f"Groq API temporarily unavailable: {e}. Using document analysis fallback."
+    system = "You are a helpful document analysis assistant. Answer questions based on the provided document context. Be concise but informative."
+    prompt = f"Document Context:\n{context}\n\nQuestion: {question}\n\nPlease provide a clear answer based on the document content."
+    return prompt, system, {"temperature": 0.3, "max_tokens": 500}
 
-def query_grok(question: str, context: str, api_key: str) -> str:
-    """Query Grok API (fallback)"""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "messages": [
-            {"role": "system", "content": "You are a document analysis assistant."},
-            {"role": "user", "content": f"Context: {context}\nQuestion: {question}"}
-        ],
-        "model": "grok-beta",
-        "stream": False,
-        "temperature": 0.2,
-        "max_tokens": 400
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.x.ai/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        return f"Grok API error: {e}"
+def grok_request(question: str, context: str):
+    """(prompt, system, options) for a Grok answer"""
+    system = "You are a document analysis assistant."
+    prompt = f"Context: {context}\nQuestion: {question}"
+    return prompt, system, {"temperature": 0.2, "max_tokens": 400}
+
+PROVIDER_REQUESTS = {"gemini": gemini_request, "groq": groq_request, "grok": grok_request}
+
+async def stream_llm(question: str, context: str = "") -> AsyncIterator[str]:
+    """
+    Like query_llm, but yields the answer as the provider generates it. Providers are
+    tried in the router's order: a failure before any text was yielded fails over to
+    the next one, a failure mid-answer raises LLMError (text already forwarded can't
+    be taken back, nor hedged). Without any provider the fallback arrives in one piece.
+    """
+    router = get_router()
+    if not router.providers:
+        yield DegradedAnswer(generate_fallback_response(question, context))
+        return
+    
+    last_error = None
+    for provider in router.ranked():
+        if not router.health[provider.name].allow():
+            continue
+        prompt, system, options = PROVIDER_REQUESTS[provider.name](question, context)
+        started = time.monotonic()
+        streaming = False
+        try:
+            async for delta in provider.stream(prompt, system=system, options=options):
+                streaming = True
+                yield delta
+        except LLMError as e:
+            router.record(provider, None)
+            if streaming:
+                raise
+            logging.error(f"{provider.name} failed before streaming any text, failing over: {e}")
+            last_error = e
+            continue
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away - frees a half-open breaker's trial slot
+            router.health[provider.name].record_abandoned(time.monotonic() - started)
+            raise
+        router.record(provider, time.monotonic() - started)
+        return
+    raise last_error or LLMError("No LLM provider available (all cooling down)")
 
 def generate_fallback_response(question: str, context: str) -> str:
     """Generate an intelligent response without external APIs"""
@@ -151,24 +115,17 @@ def generate_fallback_response(question: str, context: str) -> str:
     
     # Look for specific question types
     if any(word in question_lower for word in ['what is', 'what are', 'define', 'explain']):
-        # Find sentences containing key terms from the question
-        question_words = [w for w in question.split() if len(w) > 3]
-        relevant_sentences = []
-        
-        for sentence in context.split('.'):
-            if any(word.lower() in sentence.lower() for word in question_words):
-                relevant_sentences.append(sentence.strip())
-                if len(relevant_sentences) >= 2:
-                    break
+        # Sentences that best match the question's terms (BM25)
+        relevant_sentences = best_sentences(question, context, max_sentences=2)
         
         if relevant_sentences:
-            return f"Based on the document: {'. '.join(relevant_sentences)}."
+            return f"Based on the document: {' '.join(relevant_sentences)}"
     
     elif any(word in question_lower for word in ['how', 'when', 'where', 'why']):
         # Look for procedural or factual information
-        sentences = [s.strip() for s in context.split('.') if s.strip()]
-        if len(sentences) >= 3:
-            return f"According to the document: {'. '.join(sentences[:3])}."
+        sentences = best_sentences(question, context, max_sentences=3) or split_sentences(context)[:3]
+        if sentences:
+            return f"According to the document: {' '.join(sentences)}"
     
     # Default: return document summary
     sentences = context.split('.')[:3]
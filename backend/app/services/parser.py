@@ -1,8 +1,7 @@
 import PyPDF2
-import zipfile
-import xml.etree.ElementTree as ET
 from fastapi import UploadFile
 import io
+from app.utils.docx_parser import parse_docx_text
 
 async def parse_document(file: UploadFile) -> str:
     content = await file.read()
@@ -22,17 +21,6 @@ async def parse_document(file: UploadFile) -> str:
 def parse_docx_content(content: bytes) -> str:
     """Parse DOCX content manually without using python-docx to avoid conflicts"""
     try:
-        with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-            # Read the main document
-            doc_xml = zip_file.read('word/document.xml')
-            root = ET.fromstring(doc_xml)
-            
-            # Extract text from all text nodes
-            text_content = []
-            for elem in root.iter():
-                if elem.text:
-                    text_content.append(elem.text)
-            
-            return "\n".join(text_content)
+        return parse_docx_text(content)
     except Exception as e:
-        raise ValueError(f"Error parsing DOCX file: {e}") 
\ No newline at end of file
+        raise ValueError(f"Error parsing DOCX file: {e}")
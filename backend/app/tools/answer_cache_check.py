@@ -0,0 +1,83 @@
+"""
+Check which question pairs the answer cache would treat as the same question.
+
+Each pair is stored and looked up through a scratch AnswerCache with the configured
+embedding model and threshold. Pairs that ask for different facts must miss; the
+command exits non-zero if any of them hits. Extra pairs can come from a TSV file
+of "question<TAB>question<TAB>hit|miss" lines.
+
+    cd backend
+    python -m app.tools.answer_cache_check
+    python -m app.tools.answer_cache_check --pairs pairs.tsv --threshold 0.95
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embeddings import encode_texts
+from app.services.answer_cache import AnswerCache, question_terms
+
+# (stored question, new question, whether the cached answer may be reused)
+DEFAULT_PAIRS = [
+    ("What is the waiting period for cataract?", "What is the waiting period for hernia?", False),
+    ("What is the waiting period for cataract surgery?", "What is the waiting period for knee surgery?", False),
+    ("Is maternity covered under the policy?", "Is dental treatment covered under the policy?", False),
+    ("What is the grace period for premium payment?", "What is the waiting period for premium payment?", False),
+    ("What is the No Claim Discount?", "What is the No Claim Bonus?", False),
+    ("Is there a waiting period of 24 months for cataract?", "Is there a waiting period of 36 months for cataract?", False),
+    ("Is cataract surgery covered?", "Is cataract surgery not covered?", False),
+    ("What is the waiting period for cataract?", "what is the waiting period for cataract", True),
+    ("What is the grace period for premium payment?", "Grace period for premium payment?", True),
+    ("What is the grace period for premium payment?", "How long is the grace period for paying the premium?", True),
+    ("Does the policy cover maternity expenses?", "Are maternity expenses covered under the policy?", True),
+]
+
+
+def load_pairs(path: str):
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 3:
+                pairs.append((parts[0], parts[1], parts[2].strip().lower() == "hit"))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", help="TSV of question, question, hit|miss (added to the built-in pairs)")
+    parser.add_argument("--threshold", type=float, default=settings.ANSWER_CACHE_THRESHOLD)
+    args = parser.parse_args()
+
+    pairs = DEFAULT_PAIRS + (load_pairs(args.pairs) if args.pairs else [])
+    stored = encode_texts([pair[0] for pair in pairs])
+    asked = encode_texts([pair[1] for pair in pairs])
+    cosine = np.sum(stored * asked, axis=1) / (np.linalg.norm(stored, axis=1) * np.linalg.norm(asked, axis=1))
+
+    wrong_hits = 0
+    with tempfile.TemporaryDirectory() as directory:
+        cache = AnswerCache(os.path.join(directory, "check.sqlite3"), args.threshold,
+                            ttl_seconds=3600, max_entries=len(pairs) + 1)
+        print(f"model {settings.EMBEDDING_MODEL}, threshold {args.threshold}\n")
+        for n, (first, second, may_hit) in enumerate(pairs):
+            scope = f"check:{n}"
+            cache.put_many(scope, [first], stored[n:n + 1], ["cached answer"])
+            hit = cache.get_many(scope, [second], asked[n:n + 1])[0] is not None
+            wrong = hit and not may_hit
+            wrong_hits += wrong
+            terms_match = question_terms(first).compatible(question_terms(second))
+            print(f"{'HIT ' if hit else 'miss'}  cos {cosine[n]:.3f}  terms {'match' if terms_match else 'conflict'}"
+                  f"{'  <-- WRONG' if wrong else ''}\n      {first}\n      {second}")
+
+    if wrong_hits:
+        print(f"\n{wrong_hits} pair(s) asking for different facts would reuse a cached answer")
+        sys.exit(1)
+    print("\nNo pair asking for different facts reuses a cached answer")
+
+
+if __name__ == "__main__":
+    main()
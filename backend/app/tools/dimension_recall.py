@@ -0,0 +1,111 @@
+"""
+Offline recall@k vs. index dimension on our own documents.
+
+Encodes the indexed chunks (from the lexical indexes under DATA_DIR, or a text file
+with one passage per line) and a set of questions, then checks how many of each
+question's full-dimension top-k neighbours survive truncation or PCA at each
+candidate dimension. Optionally saves the PCA fit used by EMBEDDING_REDUCTION=pca.
+
+    cd backend
+    python -m app.tools.dimension_recall --questions questions.txt --dims 128 256 384 512
+    python -m app.tools.dimension_recall --save-pca 256
+"""
+import argparse
+import glob
+import os
+import random
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.dimension_reduction import PcaProjection, TruncationProjection, pca_path
+from app.core.embeddings import encode_texts
+from app.core.lexical_index import LexicalIndex, split_sentences
+
+
+def load_passages(texts_path: str = None, limit: int = None):
+    if texts_path:
+        with open(texts_path, encoding="utf-8") as f:
+            passages = [line.strip() for line in f if line.strip()]
+    else:
+        passages = []
+        for path in sorted(glob.glob(os.path.join(settings.DATA_DIR, "lexical", "*.npz"))):
+            index = LexicalIndex.load(path)
+            passages.extend(p for p in map(index.passage, range(index.passage_count)) if p.strip())
+    passages = list(dict.fromkeys(passages))
+    if limit and len(passages) > limit:
+        passages = random.Random(0).sample(passages, limit)
+    return passages
+
+
+def load_questions(questions_path: str, passages, count: int):
+    if questions_path:
+        with open(questions_path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    # No real questions - use the first sentence of random passages as pseudo-queries
+    sample = random.Random(1).sample(passages, min(count, len(passages)))
+    return [(split_sentences(passage) or [passage])[0] for passage in sample]
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    """Indices (unordered) of each query's k nearest passages"""
+    return np.argpartition(-(queries @ corpus.T), k - 1, axis=1)[:, :k]
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    return float(np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="passages, one per line (default: indexed chunks in DATA_DIR)")
+    parser.add_argument("--questions", help="questions, one per line (default: pseudo-queries from passages)")
+    parser.add_argument("--max-passages", type=int, default=20000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 6, 10])
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256, 384, 512, 768])
+    parser.add_argument("--methods", nargs="+", default=["truncate", "pca"], choices=["truncate", "pca"])
+    parser.add_argument("--save-pca", type=int, metavar="DIM", help="fit a PCA of this dimension and save it")
+    args = parser.parse_args()
+
+    passages = load_passages(args.texts, args.max_passages)
+    if not passages:
+        parser.error("No passages found - ingest some documents first or pass --texts")
+    questions = load_questions(args.questions, passages, args.num_queries)
+    print(f"{len(passages)} passages, {len(questions)} questions, model {settings.EMBEDDING_MODEL}")
+
+    started = time.perf_counter()
+    corpus = encode_texts(passages)
+    queries = encode_texts(questions)
+    print(f"Encoded in {time.perf_counter() - started:.1f}s\n")
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    ks = [k for k in args.k if k <= len(passages)]
+    truth = {k: top_k(queries, corpus, k) for k in ks}
+    full_dim = corpus.shape[1]
+
+    header = f"{'method':<10}{'dim':>6}{'bytes/vec':>11}" + "".join(f"{f'recall@{k}':>11}" for k in ks)
+    print(header)
+    print("-" * len(header))
+    print(f"{'full':<10}{full_dim:>6}{full_dim * 4:>11}" + "".join(f"{1.0:>11.3f}" for _ in ks))
+    for method in args.methods:
+        for dim in sorted(d for d in args.dims if d < full_dim):
+            if method == "pca" and dim > min(corpus.shape):
+                continue
+            projection = TruncationProjection(dim) if method == "truncate" else PcaProjection.fit(corpus, dim)
+            reduced_corpus = projection.apply(corpus)
+            reduced_queries = projection.apply(queries)
+            recalls = [recall_at_k(truth[k], top_k(reduced_queries, reduced_corpus, k)) for k in ks]
+            print(f"{method:<10}{dim:>6}{dim * 4:>11}" + "".join(f"{r:>11.3f}" for r in recalls))
+
+    if args.save_pca:
+        projection = PcaProjection.fit(corpus, args.save_pca)
+        path = pca_path(args.save_pca)
+        projection.save(path)
+        print(f"\nSaved {args.save_pca}-dim PCA to {path} - set EMBEDDING_REDUCTION=pca EMBEDDING_REDUCED_DIM={args.save_pca}")
+
+
+if __name__ == "__main__":
+    main()
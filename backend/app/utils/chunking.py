@@ -1,44 +1,145 @@
-import gc
-from typing import List
+import bisect
+import logging
+import re
+from collections import deque
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
-def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[str]:
+from app.core.config import settings
+
+# A sentence (up to . ! ? followed by whitespace) or a paragraph (up to a blank line)
+_SEGMENT_RE = re.compile(r"\S.*?(?:[.!?](?=\s|$)|\n\s*\n|\Z)", re.S)
+_WORDISH_RE = re.compile(r"\w+|[^\w\s]")
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int              # character offset of the chunk in the source text
+    end: int
+    page: Optional[int]     # 1-based page the chunk starts on, if pages are known
+
+
+def _get_tokenizer():
+    """The embedding model's tokenizer, or None to fall back to a word-piece estimate"""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        try:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+        except Exception as e:
+            logging.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+    return _tokenizer
+
+
+def count_tokens(texts: Sequence[str]) -> List[int]:
+    """Token counts for a batch of texts, measured with the embedding tokenizer"""
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return [len(_WORDISH_RE.findall(text)) for text in texts]
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    return [len(ids) for ids in encoded]
+
+
+def join_pages(pages: Iterable[Tuple[int, str]]) -> Tuple[str, List[int], List[int]]:
+    """Join (page_number, text) pairs the way parse_pdf_from_bytes does, keeping page offsets"""
+    parts, page_starts, page_numbers = [], [], []
+    offset = 0
+    for number, text in pages:
+        page_starts.append(offset)
+        page_numbers.append(number)
+        parts.append(f"{text}\n")
+        offset += len(text) + 1
+    return "".join(parts), page_starts, page_numbers
+
+
+def _iter_segments(text: str, batch_size: int = 256) -> Iterator[Tuple[int, int, int]]:
+    """Yield (start, end, tokens) per sentence/paragraph, tokenizing in batches"""
+    batch = []
+    for match in _SEGMENT_RE.finditer(text):
+        batch.append((match.start(), match.end()))
+        if len(batch) >= batch_size:
+            yield from _measure(text, batch)
+            batch = []
+    if batch:
+        yield from _measure(text, batch)
+
+
+def _measure(text: str, spans: List[Tuple[int, int]]) -> Iterator[Tuple[int, int, int]]:
+    counts = count_tokens([text[start:end] for start, end in spans])
+    for (start, end), tokens in zip(spans, counts):
+        yield start, end, tokens
+
+
+def _split_long_segment(text: str, start: int, end: int, tokens: int,
+                        max_tokens: int) -> Iterator[Tuple[int, int, int]]:
+    """Break a single over-long sentence at word boundaries into ~max_tokens pieces"""
+    pieces = -(-tokens // max_tokens)
+    target = max(1, (end - start) // pieces)
+    piece_start = start
+    while piece_start < end:
+        piece_end = min(piece_start + target, end)
+        if piece_end < end:
+            space = text.rfind(" ", piece_start + 1, piece_end)
+            if space > piece_start:
+                piece_end = space
+        yield piece_start, piece_end, max(1, tokens * (piece_end - piece_start) // (end - start))
+        piece_start = piece_end
+
+
+def iter_chunks(text: str, max_tokens: int = None, overlap_tokens: int = None,
+                page_starts: Sequence[int] = None,
+                page_numbers: Sequence[int] = None) -> Iterator[Chunk]:
     """
-    Memory-efficient text chunking for Render free tier
+    Single linear pass over text yielding token-bounded chunks that end on sentence or
+    paragraph boundaries, with ~overlap_tokens of trailing sentences carried forward.
+    Only the current window of sentences is held, so any document length is fine.
     """
-    try:
-        # Handle empty or small text
-        if not text or len(text) < chunk_size:
-            return [text] if text else [""]
-        
-        chunks = []
-        start = 0
-        
-        # Limit total chunks to prevent memory issues
-        max_chunks = 20  # Reasonable limit for free tier
-        chunk_count = 0
-        
-        while start < len(text) and chunk_count < max_chunks:
-            end = start + chunk_size
-            
-            # Try to break at word boundary
-            if end < len(text):
-                # Find the last space within the chunk
-                space_idx = text.rfind(' ', start, end)
-                if space_idx > start:
-                    end = space_idx
-            
-            chunk = text[start:end].strip()
-            if chunk:  # Only add non-empty chunks
-                chunks.append(chunk)
-                chunk_count += 1
-            
-            start = end - overlap if end < len(text) else end
-        
-        # Force garbage collection
-        gc.collect()
-        
-        return chunks
-        
-    except Exception as e:
-        # Return simple chunks on error
-        return [text[:300]] if text else [""] 
\ No newline at end of file
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    def make_chunk(start: int, end: int) -> Chunk:
+        page = None
+        if page_starts:
+            index = max(0, bisect.bisect_right(page_starts, start) - 1)
+            page = page_numbers[index] if page_numbers else index + 1
+        return Chunk(text[start:end].strip(), start, end, page)
+
+    window = deque()  # (start, end, tokens) of sentences in the current chunk
+    window_tokens = 0
+    emitted_end = -1
+
+    for segment in _iter_segments(text):
+        start, end, tokens = segment
+        parts = [segment] if tokens <= max_tokens else _split_long_segment(text, start, end, tokens, max_tokens)
+        for part in parts:
+            if window and window_tokens + part[2] > max_tokens:
+                yield make_chunk(window[0][0], window[-1][1])
+                emitted_end = window[-1][1]
+                # Keep trailing sentences as overlap, but always leave room for the new one
+                while window and (window_tokens > overlap_tokens or window_tokens + part[2] > max_tokens):
+                    window_tokens -= window.popleft()[2]
+            window.append(part)
+            window_tokens += part[2]
+
+    if window and window[-1][1] != emitted_end:
+        yield make_chunk(window[0][0], window[-1][1])
+
+
+def chunk_text(text: str, max_tokens: int = None, overlap_tokens: int = None) -> List[str]:
+    """Chunk text into token-bounded, sentence-aligned pieces"""
+    if not text or not text.strip():
+        return [text] if text else [""]
+    return [chunk.text for chunk in iter_chunks(text, max_tokens, overlap_tokens) if chunk.text]
+
+
+def chunk_pages(text: str, page_starts: Sequence[int],
+                page_numbers: Sequence[int] = None) -> Tuple[List[str], List[Optional[int]]]:
+    """chunk_text for text joined with join_pages, plus the page each chunk starts on"""
+    if not text or not text.strip():
+        return ([text] if text else [""]), [page_numbers[0] if page_numbers else None]
+    chunks = [chunk for chunk in iter_chunks(text, page_starts=page_starts, page_numbers=page_numbers) if chunk.text]
+    return [chunk.text for chunk in chunks], [chunk.page for chunk in chunks]
@@ -0,0 +1,71 @@
+import zipfile
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from typing import Iterator
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_BODY = _W + "body"
+_PARAGRAPH = _W + "p"
+_TABLE_CELL = _W + "tc"
+_TEXT = _W + "t"
+_TAB = _W + "tab"
+_BREAKS = (_W + "br", _W + "cr")
+
+
+def iter_docx_blocks(content: bytes) -> Iterator[str]:
+    """
+    Stream text out of word/document.xml one paragraph (or table cell) at a time.
+    Elements are cleared as soon as they are consumed, so peak memory tracks the
+    largest paragraph rather than the size of the document.
+    """
+    with zipfile.ZipFile(BytesIO(content)) as zip_file:
+        with zip_file.open("word/document.xml") as xml_file:
+            body = None
+            depth = 0
+            runs = []    # text of the paragraph currently being read
+            cells = []   # one list of paragraph texts per open table cell (tables nest)
+
+            for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    depth += 1
+                    if tag == _BODY:
+                        body = elem
+                    elif tag == _TABLE_CELL:
+                        cells.append([])
+                    continue
+
+                depth -= 1
+                if tag == _TEXT:
+                    if elem.text:
+                        runs.append(elem.text)
+                elif tag == _TAB:
+                    runs.append("\t")
+                elif tag in _BREAKS:
+                    runs.append("\n")
+                elif tag == _PARAGRAPH:
+                    text = "".join(runs).strip()
+                    runs = []
+                    elem.clear()
+                    if text:
+                        if cells:
+                            cells[-1].append(text)
+                        else:
+                            yield text
+                elif tag == _TABLE_CELL:
+                    text = " ".join(cells.pop())
+                    elem.clear()
+                    if text:
+                        if cells:
+                            cells[-1].append(text)
+                        else:
+                            yield text
+
+                # Drop finished top-level blocks so the tree never grows with the file
+                if depth == 2 and body is not None:
+                    body.clear()
+
+
+def parse_docx_text(content: bytes, separator: str = "\n") -> str:
+    """Full DOCX text with one block per line"""
+    return separator.join(iter_docx_blocks(content))
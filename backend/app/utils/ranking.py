@@ -0,0 +1,21 @@
+from collections import defaultdict
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Hashable]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[Hashable, float]]:
+    """
+    Merge ranked lists by summing weight / (k + rank) for every list an item appears
+    in. Items ranked well by several lists rise above one-off hits, and the raw
+    scores of the lists never need to be comparable.
+    """
+    scores = defaultdict(float)
+    for list_index, ranked in enumerate(ranked_lists):
+        weight = weights[list_index] if weights else 1.0
+        seen = set()
+        for rank, item in enumerate(ranked, start=1):
+            if item in seen:
+                continue
+            seen.add(item)
+            scores[item] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,33 @@
+"""
+Answer cache matching with fixed vectors, so the key-term rules are checked without
+loading an embedding model. Run from backend/: python -m pytest tests
+"""
+import numpy as np
+
+from app.services.answer_cache import AnswerCache
+
+# Identical vectors on both sides: only the key terms decide hit or miss
+VECTOR = np.ones((1, 8), dtype=np.float32)
+
+
+def lookup(tmp_path, stored: str, asked: str):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), 0.9, ttl_seconds=3600, max_entries=10)
+    cache.put_many("doc", [stored], VECTOR, ["cached answer"])
+    return cache.get_many("doc", [asked], VECTOR)[0]
+
+
+def test_paraphrase_hits(tmp_path):
+    assert lookup(tmp_path, "What is the grace period for premium payment?",
+                  "How long is the grace period for paying the premium?") == "cached answer"
+    assert lookup(tmp_path, "Does the policy cover maternity expenses?",
+                  "Are maternity expenses covered under the policy?") == "cached answer"
+
+
+def test_near_miss_misses(tmp_path):
+    assert lookup(tmp_path, "What is the waiting period for cataract?",
+                  "What is the waiting period for hernia?") is None
+    assert lookup(tmp_path, "Is there a waiting period of 24 months for cataract?",
+                  "Is there a waiting period of 36 months for cataract?") is None
+    assert lookup(tmp_path, "Is cataract surgery covered?", "Is cataract surgery not covered?") is None
+    assert lookup(tmp_path, "What is the room rent limit for Plan A?",
+                  "What is the room rent limit for Plan B?") is None
@@ -31,7 +31,7 @@ const DocumentUpload = {
                 
                 <div v-else-if="isUploading" class="uploading-content">
                     <div class="spinner"></div>
-                    <p>Uploading document...</p>
+                    <p>{{ isProcessing ? 'Processing document...' : 'Uploading document...' }}</p>
                 </div>
                 
                 <div v-else-if="uploadError" class="error-content">
@@ -68,6 +68,7 @@ const DocumentUpload = {
         return {
             isDragOver: false,
             isUploading: false,
+            isProcessing: false,
             isSuccess: false,
             uploadError: null,
             fileName: '',
@@ -112,6 +113,13 @@ const DocumentUpload = {
                     }
                 });
                 
+                // Parsing and indexing run in the background - wait for the job
+                if (response.data.status_url) {
+                    this.isProcessing = true;
+                    await this.waitForJob(response.data.status_url);
+                    this.isProcessing = false;
+                }
+                
                 this.isSuccess = true;
                 this.isUploading = false;
                 
@@ -121,15 +129,29 @@ const DocumentUpload = {
                     file: file, // Pass the actual file object
                     type: 'file',
                     document_id: response.data.document_id || 1, // Use real document_id
-                    filename: response.data.filename,
-                    preview: response.data.text_preview
+                    filename: response.data.filename
                 });
             } catch (error) {
                 console.error('Upload failed:', error);
                 this.isUploading = false;
+                this.isProcessing = false;
                 this.uploadError = error.response?.data?.detail || error.message || 'Upload failed. Please try again.';
             }
         },
+        async waitForJob(statusUrl) {
+            // Poll the ingestion job until it finishes; a failed job surfaces as an upload error
+            for (let attempt = 0; attempt < 300; attempt++) {
+                const job = (await axios.get(`${API_BASE_URL}${statusUrl}`)).data;
+                if (job.status === 'completed') {
+                    return job;
+                }
+                if (job.status === 'failed') {
+                    throw new Error(job.error || 'Document processing failed');
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+            throw new Error('Document processing is taking too long. Please try again.');
+        },
         processUrl() {
             if (this.documentUrl) {
                 this.isSuccess = true;